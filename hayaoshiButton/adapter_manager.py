@@ -0,0 +1,108 @@
+# adapter_manager.py
+
+import threading
+from typing import Any, Dict, List, Optional
+
+from async_loop import AsyncioLoopThread
+from constants import BLE_ADAPTERS, MAX_CONNECTIONS_PER_ADAPTER
+
+UNKNOWN_RSSI = -127
+
+
+# Bluetooth アダプタ1つ分。接続中のアドレスと、スキャンで見えた RSSI を持つ。
+class AdapterSlot:
+    __slots__ = ("name", "loop_thread", "limit", "addresses", "rssi")
+
+    def __init__(self, name: Optional[str], loop_thread: AsyncioLoopThread, limit: int):
+        self.name = name  # None は OS の既定アダプタ
+        self.loop_thread = loop_thread
+        self.limit = limit
+        self.addresses = set()
+        self.rssi: Dict[str, int] = {}
+
+    # bleak の BleakClient / BleakScanner に渡す引数
+    @property
+    def kwargs(self) -> Dict[str, Any]:
+        return {"adapter": self.name} if self.name else {}
+
+    @property
+    def has_capacity(self) -> bool:
+        return len(self.addresses) < self.limit
+
+
+# 接続をアダプタ (hci0..hciN) に振り分ける。
+# アダプタごとに専用の asyncio ループを持ち、そのアダプタのクライアントはすべてそのループで動かす。
+# 1つ目のアダプタは BleWorker 本体のループを共有するので、アダプタが1つなら従来と同じ動きになる。
+class AdapterManager:
+    def __init__(
+        self,
+        default_loop: AsyncioLoopThread,
+        adapters: Optional[List[str]] = None,
+        per_adapter_limit: int = MAX_CONNECTIONS_PER_ADAPTER,
+    ):
+        names = list(adapters if adapters is not None else BLE_ADAPTERS) or [None]
+        self._default_loop = default_loop
+        self.slots: List[AdapterSlot] = []
+        for i, name in enumerate(names):
+            loop_thread = default_loop if i == 0 else AsyncioLoopThread(name=f"BleAdapterLoop-{name}")
+            self.slots.append(AdapterSlot(name, loop_thread, max(1, per_adapter_limit)))
+        self._assignments: Dict[str, AdapterSlot] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        return sum(slot.limit for slot in self.slots)
+
+    def observe_rssi(self, slot: AdapterSlot, address: str, rssi: Optional[int]):
+        if rssi is not None:
+            slot.rssi[address] = rssi
+
+    def slot_for(self, address: str) -> Optional[AdapterSlot]:
+        return self._assignments.get(address)
+
+    def loop_for(self, address: str) -> AsyncioLoopThread:
+        slot = self._assignments.get(address)
+        return slot.loop_thread if slot is not None else self._default_loop
+
+    def client_kwargs(self, address: str) -> Dict[str, Any]:
+        slot = self._assignments.get(address)
+        return slot.kwargs if slot is not None else {}
+
+    # 接続先のアダプタを決めて予約する。空きがなければ None。
+    # 接続数が最少のアダプタから1台差までを候補にし、その中で RSSI が最も強いものを選ぶ。
+    def reserve(self, address: str) -> Optional[AdapterSlot]:
+        with self._lock:
+            slot = self._assignments.get(address)
+            if slot is not None:
+                return slot
+            candidates = [s for s in self.slots if s.has_capacity]
+            if not candidates:
+                return None
+            fewest = min(len(s.addresses) for s in candidates)
+            slot = max(
+                (s for s in candidates if len(s.addresses) <= fewest + 1),
+                key=lambda s: (s.rssi.get(address, UNKNOWN_RSSI), -len(s.addresses)),
+            )
+            slot.addresses.add(address)
+            self._assignments[address] = slot
+            return slot
+
+    def release(self, address: str):
+        with self._lock:
+            slot = self._assignments.pop(address, None)
+            if slot is not None:
+                slot.addresses.discard(address)
+
+    def load(self) -> Dict[str, int]:
+        with self._lock:
+            return {slot.name or "default": len(slot.addresses) for slot in self.slots}
+
+    # 本体のループ以外を止める (本体のループは BleWorker が止める)
+    def stop(self):
+        with self._lock:
+            self._assignments.clear()
+            for slot in self.slots:
+                slot.addresses.clear()
+        for slot in self.slots:
+            if slot.loop_thread is not self._default_loop:
+                slot.loop_thread.stop()
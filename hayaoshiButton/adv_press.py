@@ -0,0 +1,96 @@
+# adv_press.py
+
+import asyncio
+import struct
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from constants import (
+    ADV_COMPANY_ID,
+    ADV_PRESS_VERSION,
+    ADV_PRESS_FORMAT,
+    ADV_DEDUPE_WINDOW,
+    ADV_MAX_PRESS_AGE,
+)
+
+_PRESS = struct.Struct(ADV_PRESS_FORMAT)
+
+
+# 広告のメーカー固有データから (ボタンID, seq, 経過秒) を取り出す。押下データでなければ None。
+def decode_press(manufacturer_data: Dict[int, bytes], company_id: int = ADV_COMPANY_ID) -> Optional[Tuple[int, int, float]]:
+    payload = manufacturer_data.get(company_id)
+    if payload is None or len(payload) < _PRESS.size:
+        return None
+    version, button_id, seq, age_ms = _PRESS.unpack_from(payload)
+    if version != ADV_PRESS_VERSION:
+        return None
+    return button_id, seq, age_ms / 1000
+
+
+# 接続せずに広告だけで押下を受け取るリスナー。
+# 同じ押下は何度も広告されるので (アドレス, seq) で重複を除き、
+# 押下時刻は「受信時刻 - 経過時間」で復元する (接続間隔の待ちが無いぶんむしろ正確)。
+# scanner_kwargs_list にアダプタごとの引数を渡すと、全アダプタで同時に受信する。
+class AdvPressListener:
+    def __init__(
+        self,
+        on_press: Callable[[str, Optional[str], int, float, float, int], None],
+        name_filter: Optional[Callable[[Optional[str]], bool]] = None,
+        company_id: int = ADV_COMPANY_ID,
+        dedupe_window: float = ADV_DEDUPE_WINDOW,
+        scanner_cls: Optional[Callable[..., Any]] = None,
+        scanner_kwargs_list: Optional[List[Dict[str, Any]]] = None,
+    ):
+        self._on_press = on_press  # (アドレス, 名前, ボタンID, 押下時刻, 受信時刻, seq)
+        self._name_filter = name_filter
+        self._company_id = company_id
+        self._dedupe_window = dedupe_window
+        self._scanner_cls = scanner_cls  # None なら bleak を使う (受信開始時に読み込む)
+        self._scanner_kwargs_list = scanner_kwargs_list or [{}]
+        self._last_seen: Dict[str, Tuple[int, float]] = {}  # アドレス -> (seq, 最後に見た時刻)
+        self.names: Dict[str, str] = {}  # アドレス -> 広告に載っていた名前
+        self.received = 0
+        self.presses = 0
+
+    def _on_detection(self, device, advertisement_data):
+        decoded = decode_press(advertisement_data.manufacturer_data, self._company_id)
+        if decoded is None:
+            return
+        name = advertisement_data.local_name or device.name
+        if self._name_filter is not None and not self._name_filter(name):
+            return
+        now = time.monotonic()
+        self.received += 1
+        button_id, seq, age = decoded
+        address = device.address
+        last = self._last_seen.get(address)
+        self._last_seen[address] = (seq, now)
+        if last is not None and last[0] == seq and now - last[1] < self._dedupe_window:
+            return
+        if age > ADV_MAX_PRESS_AGE:
+            return
+        if name:
+            self.names[address] = name
+        self.presses += 1
+        self._on_press(address, name, button_id, now - age, now, seq)
+
+    async def run(self, stop: asyncio.Event):
+        scanner_cls = self._scanner_cls
+        if scanner_cls is None:
+            from bleak import BleakScanner as scanner_cls
+        scanners = [
+            scanner_cls(detection_callback=self._on_detection, **kwargs)
+            for kwargs in self._scanner_kwargs_list
+        ]
+        started = []
+        try:
+            for scanner in scanners:
+                await scanner.start()
+                started.append(scanner)
+            await stop.wait()
+        finally:
+            for scanner in started:
+                try:
+                    await scanner.stop()
+                except Exception:
+                    pass
@@ -0,0 +1,399 @@
+# benchmark.py
+#
+# 押下通知が BleCore の通知ハンドラに届いてから、early_press_winner が
+# Socket.IO クライアントに届くまでを測るベンチマーク。
+# ble_sim の疑似デバイスで BleCore を動かし、受け取った押下を PressForwarder 経由で
+# app.py の button_pressed_batch ハンドラへ Socket.IO テストクライアントで送る。
+# 順位の逆転はラウンド終了時点の台帳 (早く押した押下が後から届けば入れ替わった後の順位) で数える。
+#
+#   python benchmark.py --devices 8 --rounds 50 --output result.json
+#   python benchmark.py --save-baseline          # 今回の結果を基準として保存
+#   python benchmark.py                          # 基準と比べて悪化していれば終了コード 1
+
+import argparse
+import json
+import os
+import queue
+import random
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ble_sim import SimulatedBackend, connect_worker, measure_throughput, percentile
+from press_forwarder import PressForwarder
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+# 基準との比較に使う指標: (キー, 大きいほど良いか)
+COMPARED_METRICS = [
+    ("ble_winner_latency_ms.p50", False),
+    ("ble_winner_latency_ms.p99", False),
+    ("e2e_winner_latency_ms.p50", False),
+    ("e2e_winner_latency_ms.p99", False),
+    ("e2e_winner_latency_ms.p999", False),
+    ("ble_throughput_per_s", True),
+    ("server_throughput_per_s", True),
+    ("rank_inversions_per_round", False),
+]
+
+
+# PressForwarder の client_factory に渡し、Flask-SocketIO のテストクライアントを socketio.Client に見せかける。
+# サーバーからのイベントは pump() を呼んだときに登録済みのハンドラへ渡す。
+class TestClientTransport:
+    def __init__(self, server):
+        self._server = server
+        self._client = None
+        self._handlers: Dict[str, Callable[..., None]] = {}
+        self._lock = threading.Lock()  # 転送スレッドと計測スレッドの両方から使う
+
+    def __call__(self, **_kwargs: Any) -> "TestClientTransport":
+        return self
+
+    @property
+    def connected(self) -> bool:
+        return self._client is not None and self._client.is_connected()
+
+    def on(self, event: str, handler: Callable[..., None]):
+        self._handlers[event] = handler
+
+    def connect(self, url: str, wait_timeout: Optional[float] = None):
+        with self._lock:
+            self._client = self._server.socketio.test_client(self._server.app)
+            self._client.get_received()
+
+    def call(self, event: str, data: Any = None, timeout: Optional[float] = None) -> Any:
+        with self._lock:
+            args = () if data is None else (data,)
+            return self._client.emit(event, *args, callback=True)
+
+    def pump(self):
+        with self._lock:
+            received = self._client.get_received() if self._client is not None else []
+        for message in received:
+            handler = self._handlers.get(message["name"])
+            if handler is not None:
+                handler(*message["args"])
+
+    def disconnect(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.disconnect()
+
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    ms = [s * 1000 for s in samples]
+    return {
+        "count": len(ms),
+        "p50": percentile(ms, 50),
+        "p99": percentile(ms, 99),
+        "p999": percentile(ms, 99.9),
+        "max": max(ms) if ms else 0.0,
+    }
+
+
+# 判定順と実際に押した順が食い違っているペアの数
+def count_inversions(order: List[str], truth: Dict[str, float]) -> int:
+    times = [truth[address] for address in order if address in truth]
+    return sum(
+        1
+        for i in range(len(times))
+        for j in range(i + 1, len(times))
+        if times[i] > times[j]
+    )
+
+
+def load_server():
+    # 計測用に使い捨ての SQLite とジャーナル無しで app を読み込む
+    os.environ.setdefault("HAYAOSHI_ASYNC_MODE", "threading")
+    os.environ.setdefault("HAYAOSHI_DB", "sqlite")
+    os.environ.setdefault("HAYAOSHI_SQLITE_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+    os.environ.setdefault("HAYAOSHI_JOURNAL", "")
+    import app as server
+    return server
+
+
+def _drain_events(client, events: Dict[str, List[Any]]):
+    for message in client.get_received():
+        events.setdefault(message["name"], []).extend(message["args"])
+
+
+def _wait_for(client, events: Dict[str, List[Any]], name: str, count: int, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while True:
+        _drain_events(client, events)
+        if len(events.get(name, [])) >= count:
+            return True
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.0005)
+
+
+def _quiet(backend: SimulatedBackend):
+    for device in backend.devices.values():
+        device.streaming = False
+    time.sleep(0.1)
+
+
+# 全デバイスが spread_ms の幅でほぼ同時に押すよう予約し、実際に押した時刻 (monotonic) を返す
+def _schedule_round(backend: SimulatedBackend, spread_ms: float) -> Dict[str, float]:
+    base = time.monotonic() + 0.05
+    truth = {address: base + random.uniform(0.0, spread_ms / 1000) for address in backend.devices}
+    for address, device in backend.devices.items():
+        device.schedule_press(truth[address])
+    return truth
+
+
+def _round_timeout(backend: SimulatedBackend, spread_ms: float) -> float:
+    max_latency = max(d.conn_interval + d.jitter for d in backend.devices.values())
+    return 0.05 + spread_ms / 1000 + max_latency + 1.0
+
+
+def _summarize_order(order: List[str], truth: Dict[str, float]) -> Tuple[int, bool, int]:
+    # 最終的な順位表から、逆転ペア数・1位の正誤・届かなかった押下数を出す
+    correct = bool(order) and order[0] == min(truth, key=truth.get)
+    return count_inversions(order, truth), correct, len(truth) - len(order)
+
+
+# BleCore 単体 (ローカルの台帳) での1位通知までの遅延と、最終的な順位の正しさ
+def run_local_rounds(worker, backend: SimulatedBackend, rounds: int, spread_ms: float) -> Dict[str, Any]:
+    _quiet(backend)
+    deltas: "queue.Queue" = queue.Queue()
+    winners: "queue.Queue" = queue.Queue()
+    on_delta = deltas.put
+    on_winner = lambda winner: winners.put((winner, time.monotonic()))
+    worker.on("early_press_order_delta", on_delta)
+    worker.on("early_press_winner", on_winner)
+
+    latencies: List[float] = []
+    inversions = correct_winners = missing = 0
+    try:
+        for _ in range(rounds):
+            worker.start_local_game()
+            time.sleep(0.02)
+            for q in (deltas, winners):
+                while not q.empty():
+                    q.get_nowait()
+            truth = _schedule_round(backend, spread_ms)
+
+            # 差分を順位の位置に挿入し直すと、ラウンド終了時点の台帳と同じ並びになる
+            order: List[str] = []
+            deadline = time.monotonic() + _round_timeout(backend, spread_ms)
+            while len(order) < len(truth) and time.monotonic() < deadline:
+                try:
+                    delta = deltas.get(timeout=0.05)
+                except queue.Empty:
+                    continue
+                order.insert(delta["order"] - 1, delta["address"])
+            try:
+                winner, received_at = winners.get_nowait()
+                latencies.append(received_at - winner["host_time"])
+            except queue.Empty:
+                pass
+            worker.stop_local_game()
+
+            round_inversions, correct, round_missing = _summarize_order(order, truth)
+            inversions += round_inversions
+            correct_winners += correct
+            missing += round_missing
+    finally:
+        worker.off("early_press_order_delta", on_delta)
+        worker.off("early_press_winner", on_winner)
+    return {
+        "ble_winner_latency_ms": latency_summary(latencies),
+        "ble_correct_winner_rate": correct_winners / rounds if rounds else 0.0,
+        "ble_rank_inversions_per_round": inversions / rounds if rounds else 0.0,
+        "ble_missing_presses": missing,
+    }
+
+
+# 実運用と同じく BleCore -> PressForwarder -> button_pressed_batch でサーバーの台帳へ送り、
+# 押下から early_press_winner が Socket.IO クライアントに届くまでと、最終的な順位の正しさを測る
+def run_server_rounds(worker, backend: SimulatedBackend, server, rounds: int, spread_ms: float) -> Dict[str, Any]:
+    _quiet(backend)
+    transport = TestClientTransport(server)
+    forwarder = PressForwarder(client_factory=transport)
+    forwarder.start()
+    deadline = time.monotonic() + 5.0
+    while not forwarder.connected and time.monotonic() < deadline:
+        time.sleep(0.01)
+    worker.set_forwarder(forwarder)
+    client = server.socketio.test_client(server.app)
+
+    latencies: List[float] = []
+    inversions = correct_winners = missing = 0
+    try:
+        for _ in range(rounds):
+            server.game_state.start_game()
+            transport.pump()  # 転送役にラウンド開始を知らせる
+            client.get_received()
+            events: Dict[str, List[Any]] = {}
+            time.sleep(0.02)
+            truth = _schedule_round(backend, spread_ms)
+
+            timeout = _round_timeout(backend, spread_ms)
+            if _wait_for(client, events, 'early_press_winner', 1, timeout):
+                # 転送役が host_time を壁時計に直して送っている
+                latencies.append(time.time() - events['early_press_winner'][0]["host_time"])
+            _wait_for(client, events, 'early_press_order_delta', len(truth), timeout)
+            order = [entry["address"] for entry in server.game_state.current_order()["order"]]
+            server.game_state.stop_game()
+            transport.pump()
+
+            round_inversions, correct, round_missing = _summarize_order(order, truth)
+            inversions += round_inversions
+            correct_winners += correct
+            missing += round_missing
+    finally:
+        worker.set_forwarder(None)
+        forwarder.stop()
+        client.disconnect()
+    return {
+        "e2e_winner_latency_ms": latency_summary(latencies),
+        "correct_winner_rate": correct_winners / rounds if rounds else 0.0,
+        "rank_inversions": inversions,
+        "rank_inversions_per_round": inversions / rounds if rounds else 0.0,
+        "missing_presses": missing,
+    }
+
+
+# サーバー単体: 1ラウンドに大量の押下を送り、全差分が返るまでの処理速度
+def measure_server_throughput(server, presses: int) -> float:
+    client = server.socketio.test_client(server.app)
+    server.game_state.start_game()
+    client.get_received()
+    events: Dict[str, List[Any]] = {}
+    started = time.perf_counter()
+    now = time.time()
+    for i in range(presses):
+        client.emit('button_pressed', {
+            "address": SimulatedBackend.address_for(i), "button_id": 1, "timestamp": now + i * 1e-6,
+        })
+    _wait_for(client, events, 'early_press_order_delta', presses, 10.0)
+    elapsed = time.perf_counter() - started
+    server.game_state.stop_game()
+    client.disconnect()
+    return len(events.get('early_press_order_delta', [])) / elapsed if elapsed > 0 else 0.0
+
+
+def _lookup(result: Dict[str, Any], dotted: str) -> Optional[float]:
+    value: Any = result
+    for key in dotted.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+# 基準より tolerance 以上悪化した指標を返す
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[Tuple[str, float, float]]:
+    regressions = []
+    for key, higher_is_better in COMPARED_METRICS:
+        current, expected = _lookup(result, key), _lookup(baseline, key)
+        if current is None or expected is None:
+            continue
+        if higher_is_better:
+            worse = current < expected * (1 - tolerance)
+        else:
+            # 0 付近の指標 (順位の逆転数など) は絶対値でも少し余裕を持たせる
+            worse = current > expected * (1 + tolerance) + 1e-3
+        if worse:
+            regressions.append((key, expected, current))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="押下から1位通知までのレイテンシ・スループット・公平性のベンチマーク")
+    parser.add_argument("--devices", type=int, default=8, help="疑似デバイス数")
+    parser.add_argument("--rounds", type=int, default=50, help="計測ラウンド数")
+    parser.add_argument("--spread-ms", type=float, default=20.0, help="1ラウンド内で押下時刻がばらつく幅 (ms)")
+    parser.add_argument("--conn-interval-ms", type=float, default=15.0, help="BLE 接続間隔 (ms)")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="通知遅延に加える追加ジッター (ms)")
+    parser.add_argument("--drift-ppm", type=float, default=20.0, help="デバイス時計のドリフト (ppm)")
+    parser.add_argument("--rate", type=float, default=100.0, help="スループット測定時の1台あたり通知レート (Hz)")
+    parser.add_argument("--duration", type=float, default=3.0, help="スループット測定時間 (秒)")
+    parser.add_argument("--server-presses", type=int, default=2000, help="サーバー単体スループット測定の押下数")
+    parser.add_argument("--ble-only", action="store_true", help="サーバーを使わず BleCore だけを測る")
+    parser.add_argument("--seed", type=int, default=None, help="乱数シード")
+    parser.add_argument("--output", help="結果を書き出す JSON ファイル")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="比較する基準ファイル")
+    parser.add_argument("--save-baseline", action="store_true", help="今回の結果を基準として保存する")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="悪化とみなす割合 (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    server = None if args.ble_only else load_server()
+    backend = SimulatedBackend.synthetic(
+        args.devices,
+        rate_hz=args.rate,
+        jitter_ms=args.jitter_ms,
+        conn_interval_ms=args.conn_interval_ms,
+        clock_drift_ppm=args.drift_ppm,
+    )
+    worker, connect_seconds, failed = connect_worker(backend)
+    try:
+        if failed:
+            print(f"接続に失敗したデバイス: {failed}", file=sys.stderr)
+        throughput = measure_throughput(backend, args.duration)
+        result: Dict[str, Any] = {
+            "config": vars(args),
+            "connect_seconds": connect_seconds,
+            "ble_throughput_per_s": throughput["throughput_per_s"],
+            "ble_handler_us": {
+                "p50": throughput["handler_us_p50"],
+                "p99": throughput["handler_us_p99"],
+                "p999": throughput["handler_us_p999"],
+            },
+        }
+        result.update(run_local_rounds(worker, backend, args.rounds, args.spread_ms))
+        if server is not None:
+            result.update(run_server_rounds(worker, backend, server, args.rounds, args.spread_ms))
+            result["server_throughput_per_s"] = measure_server_throughput(server, args.server_presses)
+        else:
+            # サーバー無しではローカルの台帳の順位で比べる
+            result["rank_inversions_per_round"] = result["ble_rank_inversions_per_round"]
+    finally:
+        worker.cleanup()
+
+    ble = result["ble_winner_latency_ms"]
+    print(f"BleCore 1位通知: p50 {ble['p50']:.3f} ms / p99 {ble['p99']:.3f} ms / p99.9 {ble['p999']:.3f} ms")
+    if server is not None:
+        e2e = result["e2e_winner_latency_ms"]
+        print(f"Socket.IO 1位通知: p50 {e2e['p50']:.3f} ms / p99 {e2e['p99']:.3f} ms / p99.9 {e2e['p999']:.3f} ms")
+        print(f"サーバー処理速度: {result['server_throughput_per_s']:.0f} 件/秒")
+    print(f"通知処理速度: {result['ble_throughput_per_s']:.0f} 件/秒, "
+          f"ハンドラ p99 {result['ble_handler_us']['p99']:.1f} µs")
+    print(f"公平性 (BleCore): 正しい1位 {result['ble_correct_winner_rate'] * 100:.0f}%, "
+          f"順位の逆転 {result['ble_rank_inversions_per_round']:.2f} 件/ラウンド")
+    if server is not None:
+        print(f"公平性 (サーバー): 正しい1位 {result['correct_winner_rate'] * 100:.0f}%, "
+              f"順位の逆転 {result['rank_inversions']} 件 ({result['rank_inversions_per_round']:.2f} 件/ラウンド)")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"基準を保存しました: {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("基準ファイルがないため比較を省略しました (--save-baseline で作成できます)。")
+        return
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(result, baseline, args.tolerance)
+    if not regressions:
+        print("基準からの悪化はありません。")
+        return
+    for key, expected, current in regressions:
+        print(f"悪化: {key} 基準 {expected:.3f} -> 今回 {current:.3f}")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,857 @@
+import asyncio
+import struct
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Dict, Optional, Any, Callable, Coroutine, Union
+
+
+from adapter_manager import AdapterManager, AdapterSlot
+from adv_press import AdvPressListener
+from async_loop import AsyncioLoopThread
+from clock_sync import ClockOffsetEstimator
+from ble_scanner import StreamingScanner
+from gatt_cache import GattCache
+from notification_metrics import NotificationMetrics
+from press_ledger import PressLedger, UNKNOWN_DEVICE_NAME
+from reconnect import ExponentialBackoff, LinkStats
+from constants import (
+    MAX_ALLOWED_DEVICES,
+    MAX_CONNECTIONS_PER_ADAPTER,
+    RATE_UI_INTERVAL,
+    SCAN_TIMEOUT,
+    CONNECT_CONCURRENCY,
+    CONNECT_TIMEOUT,
+    ESP32_SERVICE_UUID,
+    ESP32_CHAR_UUID_NOTIFY,
+    PRESS_FRAME_FORMAT,
+    SYNC_OPCODE,
+    SYNC_PING_FORMAT,
+    SYNC_ECHO_FORMAT,
+    CLOCK_SYNC_INTERVAL,
+    CLOCK_SYNC_BURST,
+    CLOCK_SYNC_TIMEOUT,
+)
+
+
+# BleCore が出すイベント名と引数。BleWorker はこれを同名の Qt シグナルに載せ替える。
+EVENTS = {
+    "scan_finished": (list,),
+    "device_scanned": (dict,),
+    "connected": (str, str),
+    "disconnected": (str,),
+    "services_discovered": (str, list),
+    "characteristics_discovered": (str, str, list),
+    "characteristic_read": (str, str, list),
+    "characteristic_write_ack": (str, str),
+    "notification_received": (str, str, list),
+    "notification_rate_updated": (dict,),
+    "error_occurred": (str,),
+    "early_press_order_updated": (list,),
+    "early_press_order_delta": (dict,),  # 追加された1件 (order に順位, seq に通し番号)
+    "early_press_winner": (dict,),
+    "notify_started": (str, str),
+    "connect_all_finished": (dict,),  # デバイス名 -> 結果メッセージ (成功時は None)
+    "command_finished": (str, bool),  # コマンド名, 成功したか
+    "link_lost": (str, str),  # 予期しない切断 (アドレス, デバイス名)。再接続は自動で試みる
+    "link_stats_updated": (dict,),  # 切断・再接続のたびにデバイスごとの停止時間などを送る
+    "adv_mode_changed": (bool,),  # アドバタイズ押下モードの受信を開始/停止した
+}
+
+# イベントの受け取り手。sink(event, *args) の形で呼ばれる。
+Sink = Callable[..., None]
+
+
+# スキャン・接続・通知・押下判定の本体。Qt に依存せず asyncio のループ (専用スレッド) だけで動く。
+# 結果はイベントとして登録済みの sink に渡す。sink はイベントを出したループのスレッドで呼ばれるので、
+# 重い処理やブロックする処理は sink 側で別スレッドへ渡すこと。
+# 押下だけは専用の受け取り手 (set_journal / set_forwarder) にも直接流す。
+class BleCore:
+    # client_cls / scanner_cls には bleak と同じ API を持つ別実装 (ble_sim など) を渡せる。
+    # adapters を省略すると constants.BLE_ADAPTERS (環境変数 HAYAOSHI_BLE_ADAPTERS) を使う。
+    def __init__(
+        self,
+        max_devices: int = MAX_ALLOWED_DEVICES,
+        client_cls: Optional[Callable[..., Any]] = None,
+        scanner_cls: Optional[Callable[..., Any]] = None,
+        gatt_cache: Optional[GattCache] = None,
+        adapters: Optional[List[str]] = None,
+        per_adapter_limit: int = MAX_CONNECTIONS_PER_ADAPTER,
+    ):
+        self.max_devices = max_devices
+        self._client_cls = client_cls  # None なら最初の接続時に bleak を読み込む
+        self._scanner_cls = scanner_cls
+        self._loop_thread = AsyncioLoopThread(name="BleCoreLoop")
+        # デバイスごとの処理は、そのデバイスを割り当てたアダプタのループで動かす
+        self._adapters = AdapterManager(self._loop_thread, adapters, per_adapter_limit)
+        self._pending_connects = set()
+        self._clients: Dict[str, Any] = {}
+        self._scanned_devices: Dict[str, str] = {}  # アドレス -> スキャン時のデバイス名
+        self._gatt_cache = gatt_cache if gatt_cache is not None else GattCache()
+        self._notification_metrics: Dict[str, NotificationMetrics] = {}
+        self._rate_flush_task: Optional[asyncio.Task] = None
+        self._clock_sync: Dict[str, ClockOffsetEstimator] = {}
+        self._clock_sync_tasks: Dict[str, asyncio.Task] = {}
+        self._sync_waiters: Dict[str, Any] = {}  # アドレス -> (seq, 送信時刻, Future)
+        self._connected_target_addresses: Dict[str, str] = {}
+        self._reconnect_tasks: Dict[str, asyncio.Task] = {}
+        self._link_stats: Dict[str, LinkStats] = {}
+        self._closing = False
+        self._adv_listener: Optional[AdvPressListener] = None
+        self._adv_stop: Optional[asyncio.Event] = None
+
+        self.allowed_device_name: Optional[str] = None
+        self.target_device_names: List[str] = []
+
+        self._press_ledger = PressLedger()
+        self._press_lock = threading.Lock()  # 複数アダプタのループから同時に押下が届くため
+        # EventJournal を設定するとローカル判定のラウンドと押下を記録する (時刻は monotonic)。
+        # サーバーへ転送するときはラウンドを知っている PressForwarder にジャーナルを渡す
+        self._journal = None
+        self._forwarder = None  # PressForwarder を設定すると押下をサーバーの台帳へ流す
+        self._is_game_active = False
+        self._winner_address: Optional[str] = None
+        self._sinks: List[Sink] = []
+        self._handlers: Dict[str, List[Callable[..., None]]] = {}
+
+    # すべてのイベントを受け取る sink を登録する
+    def add_sink(self, sink: Sink):
+        self._sinks.append(sink)
+
+    def remove_sink(self, sink: Sink):
+        if sink in self._sinks:
+            self._sinks.remove(sink)
+
+    # 1種類のイベントだけを受け取るコールバックを登録する
+    def on(self, event: str, callback: Callable[..., None]):
+        if event not in EVENTS:
+            raise ValueError(f"不明なイベントです: {event}")
+        self._handlers.setdefault(event, []).append(callback)
+
+    def off(self, event: str, callback: Callable[..., None]):
+        handlers = self._handlers.get(event, [])
+        if callback in handlers:
+            handlers.remove(callback)
+
+    # 受け取り手の例外で BLE の処理が止まらないよう、ここで握りつぶしてログに出す
+    def _emit(self, event: str, *args: Any):
+        for sink in list(self._sinks):
+            try:
+                sink(event, *args)
+            except Exception as e:
+                print(f"イベント {event} の受け取り手でエラー: {e}")
+        for callback in list(self._handlers.get(event, ())):
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"イベント {event} の受け取り手でエラー: {e}")
+
+    # コマンドを専用ループのキューに積んで即座に戻る。完了は command_finished イベントで通知する。
+    def _submit(
+        self,
+        command: str,
+        coro: Coroutine[Any, Any, Any],
+        error_prefix: str,
+        loop_thread: Optional[AsyncioLoopThread] = None,
+    ) -> Future:
+        future = (loop_thread or self._loop_thread).submit(coro)
+
+        def _on_done(f: Future):
+            if f.cancelled():
+                self._emit("command_finished", command, False)
+                return
+            exc = f.exception()
+            if exc is not None:
+                self._emit("error_occurred", f"{error_prefix}: {exc}")
+                self._emit("command_finished", command, False)
+            else:
+                self._emit("command_finished", command, True)
+
+        future.add_done_callback(_on_done)
+        return future
+
+    # 本体のループから、別アダプタのループでコルーチンを動かして完了を待つ
+    async def _run_on(self, loop_thread: AsyncioLoopThread, coro: Coroutine[Any, Any, Any]) -> Any:
+        if loop_thread is self._loop_thread:
+            return await coro
+        return await asyncio.wrap_future(loop_thread.submit(coro))
+
+    # stop_predicate には検出済みデバイス (アドレス -> 情報) を受け取り、
+    # スキャンを打ち切るなら True を返す関数を渡せる
+    def start_scan(self, stop_predicate: Optional[Callable[[Dict[str, Dict[str, Any]]], bool]] = None):
+        self._submit("scan", self._perform_scan(stop_predicate=stop_predicate), "Scan error")
+
+    async def _perform_scan(
+        self,
+        expected_names: Optional[List[str]] = None,
+        stop_predicate: Optional[Callable[[Dict[str, Dict[str, Any]]], bool]] = None,
+    ):
+        # 接続対象名が決まっていれば、全台を検出した時点でスキャンを打ち切る
+        if expected_names is None and not self.allowed_device_name:
+            expected_names = self.target_device_names
+        # アダプタが複数あれば全アダプタで同時にスキャンし、アダプタごとの RSSI を振り分けに使う
+        scans = [
+            StreamingScanner(
+                on_device=self._detection_handler(slot),
+                name_filter=self._is_scan_allowed,
+                expected_names=expected_names,
+                stop_predicate=stop_predicate,
+                scanner_cls=self._scanner_cls,
+                scanner_kwargs=slot.kwargs,
+            ).run(SCAN_TIMEOUT)
+            for slot in self._adapters.slots
+        ]
+        devices: Dict[str, Dict[str, Any]] = {}
+        for device_list in await asyncio.gather(*scans):
+            for info in device_list:
+                best = devices.get(info["address"])
+                if best is None or (info["rssi"] or -127) > (best["rssi"] or -127):
+                    devices[info["address"]] = info
+        self._emit("scan_finished", list(devices.values()))
+
+    def _detection_handler(self, slot: AdapterSlot) -> Callable[[Dict[str, Any]], None]:
+        def _on_device(info: Dict[str, Any]):
+            self._adapters.observe_rssi(slot, info["address"], info["rssi"])
+            self._on_device_detected(info)
+        return _on_device
+
+    def _is_scan_allowed(self, name: Optional[str]) -> bool:
+        if self.allowed_device_name:
+            return name == self.allowed_device_name
+        elif self.target_device_names:
+            return name in self.target_device_names
+        return True
+
+    def _on_device_detected(self, info: Dict[str, Any]):
+        if info["name"] != "Unknown":
+            self._scanned_devices[info["address"]] = info["name"]
+        self._emit("device_scanned", info)
+
+    # 最大接続台数の枠を使っているアドレス。切断されて再接続を待っているデバイスも枠を持ち続ける
+    def _occupied_addresses(self) -> set:
+        return set(self._connected_target_addresses) | self._pending_connects | set(self._reconnect_tasks)
+
+    def connect_device(self, address: str):
+        if address in self._pending_connects:
+            return
+
+        # 再接続待ちのデバイスを手動でつなぎ直すときは、そのデバイス自身の枠を使う
+        if len(self._occupied_addresses() - {address}) >= self.max_devices:
+            self._emit("error_occurred", f"最大接続台数({self.max_devices})に達しています。")
+            return
+
+        if address in self._clients and self._clients[address].is_connected:
+            if address in self._connected_target_addresses:
+                self._emit("connected", address, self._connected_target_addresses[address])
+            else:
+                self._emit("error_occurred", f"{address} は接続済みですがターゲットデバイスではありません。")
+            return
+
+        slot = self._adapters.reserve(address)
+        if slot is None:
+            self._emit("error_occurred", f"すべての Bluetooth アダプタが接続数の上限に達しています (合計{self._adapters.capacity}台)。")
+            return
+
+        self._pending_connects.add(address)
+        self._submit("connect", self._perform_connect(address), "接続エラー", slot.loop_thread)
+
+    async def _perform_connect(self, address: str):
+        try:
+            await self._setup_target(address)
+        except BaseException:
+            self._adapters.release(address)
+            raise
+        finally:
+            self._pending_connects.discard(address)
+
+    def connect_all_targets(self, max_concurrency: int = CONNECT_CONCURRENCY, timeout: float = CONNECT_TIMEOUT):
+        if not self.target_device_names:
+            self._emit("error_occurred", "接続対象デバイス名が設定されていません。")
+            return
+        self._submit(
+            "connect_all",
+            self._perform_connect_all_targets(max_concurrency, timeout),
+            "一括接続エラー",
+        )
+
+    async def _perform_connect_all_targets(self, max_concurrency: int, timeout: float):
+        results: Dict[str, Optional[str]] = {}
+        connected_names = set(self._connected_target_addresses.values())
+        names = [n for n in self.target_device_names if n not in connected_names]
+
+        # まだアドレスが分かっていない名前があるときだけスキャンする
+        addresses = self._addresses_by_name(names)
+        if len(addresses) < len(names):
+            await self._perform_scan(expected_names=[n for n in names if n not in addresses])
+            addresses = self._addresses_by_name(names)
+
+        occupied = self._occupied_addresses()
+        free_slots = self.max_devices - len(occupied)
+        new_slots = 0  # 再接続待ちのデバイスは自分の枠を使うので数えない
+        jobs = []
+        for name in names:
+            address = addresses.get(name)
+            if address is None:
+                results[name] = "スキャンで見つかりませんでした。"
+            elif address in self._pending_connects:
+                results[name] = "接続処理中です。"
+            elif address not in occupied and new_slots >= free_slots:
+                results[name] = f"最大接続台数({self.max_devices})に達しています。"
+            else:
+                slot = self._adapters.reserve(address)
+                if slot is None:
+                    results[name] = "すべての Bluetooth アダプタが接続数の上限に達しています。"
+                    continue
+                if address not in occupied:
+                    new_slots += 1
+                self._pending_connects.add(address)
+                jobs.append((name, address, slot))
+
+        # 同時接続数はアダプタごとに数える (接続処理はアダプタ単位で直列化されやすいため)
+        semaphores = {id(slot): asyncio.Semaphore(max(1, max_concurrency)) for slot in self._adapters.slots}
+
+        async def _connect_one(name: str, address: str, slot: AdapterSlot):
+            try:
+                async with semaphores[id(slot)]:
+                    await self._run_on(slot.loop_thread, asyncio.wait_for(self._setup_target(address), timeout))
+                results[name] = None
+            except asyncio.TimeoutError:
+                self._adapters.release(address)
+                results[name] = f"{timeout:.0f}秒以内に接続できませんでした。"
+            except Exception as e:
+                self._adapters.release(address)
+                results[name] = str(e)
+            finally:
+                self._pending_connects.discard(address)
+
+        await asyncio.gather(*(_connect_one(name, address, slot) for name, address, slot in jobs))
+        for name, message in results.items():
+            if message is not None:
+                self._emit("error_occurred", f"{name}: {message}")
+        self._emit("connect_all_finished", results)
+
+    def _addresses_by_name(self, names: List[str]) -> Dict[str, str]:
+        wanted = set(names)
+        addresses = {name: addr for addr, name in self._scanned_devices.items() if name in wanted}
+        # 過去に接続したことのあるデバイスは GATT キャッシュからアドレスを引ける
+        for name in wanted - addresses.keys():
+            address = self._gatt_cache.address_for_name(name)
+            if address is not None:
+                addresses[name] = address
+        return addresses
+
+    # 接続 → ターゲット確認 → ハンドル解決 → 通知開始 を1つのコルーチンで行う
+    async def _setup_target(self, address: str):
+        try:
+            await self._connect_target(address)
+            handles = self._gatt_handles(address)
+            try:
+                await self._perform_start_notify(address, ESP32_CHAR_UUID_NOTIFY, handles["notify"])
+            except Exception:
+                if not handles.get("cached"):
+                    raise
+                # ファームウェア更新などでハンドルが変わった場合は一度だけ解決し直す
+                self._gatt_cache.invalidate(address)
+                handles = self._gatt_handles(address)
+                await self._perform_start_notify(address, ESP32_CHAR_UUID_NOTIFY, handles["notify"])
+        except BaseException:
+            await self._discard_client(address)
+            raise
+        self._emit("notify_started", address, ESP32_CHAR_UUID_NOTIFY)
+        if handles.get("raise_flag") is not None:
+            self._start_clock_sync(address, handles["raise_flag"])
+
+    def _gatt_handles(self, address: str) -> Dict[str, Any]:
+        handles = self._gatt_cache.get(address)
+        if handles is not None:
+            handles["cached"] = True
+            return handles
+        client = self._clients[address]
+        return self._gatt_cache.resolve(address, self._connected_target_addresses[address], client.services)
+
+    async def _discard_client(self, address: str):
+        self._stop_clock_sync(address)
+        client = self._clients.pop(address, None)
+        self._connected_target_addresses.pop(address, None)
+        self._notification_metrics.pop(address, None)
+        if client is not None and client.is_connected:
+            try:
+                await client.disconnect()
+            except Exception:
+                pass
+
+    async def _connect_target(self, address: str):
+        cached = self._gatt_cache.get(address)
+        # ハンドルが分かっているデバイスはターゲットサービス以外の探索を省く
+        client_cls = self._client_cls
+        if client_cls is None:
+            # bleak は読み込みに時間がかかるので、起動時ではなく最初の接続で import する
+            from bleak import BleakClient as client_cls
+        client = client_cls(
+            address,
+            services=[ESP32_SERVICE_UUID] if cached else None,
+            disconnected_callback=self._on_link_lost,
+            **self._adapters.client_kwargs(address),
+        )
+        await client.connect()
+        name = self._scanned_devices.get(address) or (cached or {}).get("name")
+        if name is None:
+            name = client.services.device.name if client.services else "No Name"
+
+        is_target = False
+        if self.allowed_device_name and name == self.allowed_device_name:
+            is_target = True
+        elif self.target_device_names and name in self.target_device_names:
+            is_target = True
+        if not is_target:
+            await client.disconnect()
+            raise Exception(f"{name}は許可されたデバイスではありません。")
+
+        self._clients[address] = client
+        self._connected_target_addresses[address] = name
+        self._notification_metrics[address] = NotificationMetrics(address)
+        self._emit("connected", address, name)
+
+    def disconnect_device(self, address: str):
+        if address not in self._clients and address not in self._reconnect_tasks:
+            self._emit("error_occurred", f"{address} は接続されていません。")
+            return
+        self._submit("disconnect", self._perform_disconnect(address), "切断エラー", self._adapters.loop_for(address))
+
+    async def _perform_disconnect(self, address: str):
+        self._stop_reconnect(address)
+        self._stop_clock_sync(address)
+        # 先に管理から外しておき、切断コールバックで再接続しないようにする
+        client = self._clients.pop(address, None)
+        self._connected_target_addresses.pop(address, None)
+        self._notification_metrics.pop(address, None)
+        self._link_stats.pop(address, None)
+        try:
+            if client is not None:
+                await client.disconnect()
+        finally:
+            self._adapters.release(address)
+        self._emit("disconnected", address)
+
+    # --- 予期しない切断からの自動復帰 ---
+    # bleak の disconnected_callback。ループスレッド上で呼ばれる。
+    def _on_link_lost(self, client: Any):
+        address = client.address
+        if self._closing or self._clients.get(address) is not client:
+            return  # こちらから切断したクライアント
+        name = self._connected_target_addresses.get(address, UNKNOWN_DEVICE_NAME)
+        self._stop_clock_sync(address)
+        del self._clients[address]
+        self._connected_target_addresses.pop(address, None)
+        self._notification_metrics.pop(address, None)
+
+        stats = self._link_stats.setdefault(address, LinkStats(address, name))
+        stats.mark_down(time.monotonic())
+        self._emit("link_lost", address, name)
+        self._emit("disconnected", address)
+        self._emit("link_stats_updated", stats.to_dict(time.monotonic()))
+        if address not in self._reconnect_tasks:
+            self._reconnect_tasks[address] = asyncio.get_running_loop().create_task(self._reconnect_loop(address))
+
+    async def _reconnect_loop(self, address: str):
+        stats = self._link_stats[address]
+        backoff = ExponentialBackoff()
+        try:
+            while not self._closing:
+                await asyncio.sleep(backoff.next_delay())
+                if address in self._clients or address in self._pending_connects:
+                    break  # 手動で接続し直された
+                # 枠は持ち続けているはずだが、念のため上限を超えてつなぎ直さない
+                if len(self._occupied_addresses() - {address}) >= self.max_devices:
+                    self._emit("error_occurred", f"最大接続台数({self.max_devices})に達しているため {stats.name} の再接続をやめます。")
+                    self._adapters.release(address)
+                    break
+                stats.attempts += 1
+                self._pending_connects.add(address)
+                try:
+                    # GATT キャッシュがあればサービス探索を省いてそのまま通知を再開できる
+                    await asyncio.wait_for(self._setup_target(address), CONNECT_TIMEOUT)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self._emit("link_stats_updated", stats.to_dict(time.monotonic()))
+                    if stats.attempts == 1:
+                        self._emit("error_occurred", f"{stats.name} の再接続に失敗しました。再試行を続けます: {e}")
+                    continue
+                finally:
+                    self._pending_connects.discard(address)
+                break
+            if address in self._clients:
+                stats.mark_up(time.monotonic())
+                self._emit("link_stats_updated", stats.to_dict(time.monotonic()))
+        finally:
+            if self._reconnect_tasks.get(address) is asyncio.current_task():
+                del self._reconnect_tasks[address]
+
+    def _stop_reconnect(self, address: str):
+        task = self._reconnect_tasks.pop(address, None)
+        if task is not None:
+            task.cancel()
+
+    def get_link_stats(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        return {address: stats.to_dict(now) for address, stats in self._link_stats.items()}
+
+    def discover_services(self, address: str):
+        if address not in self._clients:
+            self._emit("error_occurred", f"{address} は接続されていません。")
+            return
+        self._submit("discover_services", self._perform_discover_services(address), "サービス探索エラー", self._adapters.loop_for(address))
+
+    async def _perform_discover_services(self, address: str):
+        services = self._clients[address].services
+        services_info = [{
+            "uuid": str(s.uuid),
+            "description": s.description,
+        } for s in services]
+        self._emit("services_discovered", address, services_info)
+
+    def discover_characteristics(self, address: str, service_uuid: str):
+        if address not in self._clients:
+            self._emit("error_occurred", f"{address} は接続されていません。")
+            return
+        self._submit("discover_characteristics", self._perform_discover_characteristics(address, service_uuid), "キャラクタリスティック探索エラー", self._adapters.loop_for(address))
+
+    async def _perform_discover_characteristics(self, address: str, service_uuid: str):
+        services = self._clients[address].services
+        characteristics_info = []
+        for service in services:
+            if str(service.uuid).lower() == service_uuid.lower():
+                for char in service.characteristics:
+                    characteristics_info.append({
+                        "uuid": str(char.uuid),
+                        "description": char.description,
+                        "properties": [p.name for p in char.properties],
+                    })
+                break
+        self._emit("characteristics_discovered", address, service_uuid, characteristics_info)
+
+    def read_characteristic(self, address: str, char_uuid: str):
+        if address not in self._clients:
+            self._emit("error_occurred", f"{address} は接続されていません。")
+            return
+        self._submit("read_characteristic", self._perform_read_characteristic(address, char_uuid), "読み取りエラー", self._adapters.loop_for(address))
+
+    async def _perform_read_characteristic(self, address: str, char_uuid: str):
+        client = self._clients[address]
+        value = await client.read_gatt_char(char_uuid)
+        self._emit("characteristic_read", address, char_uuid, list(value))
+
+    def write_characteristic(self, address: str, char_uuid: str, value_list: List[int]):
+        if address not in self._clients:
+            self._emit("error_occurred", f"{address} は接続されていません。")
+            return
+        self._submit("write_characteristic", self._perform_write_characteristic(address, char_uuid, bytes(value_list)), "書き込みエラー", self._adapters.loop_for(address))
+
+    async def _perform_write_characteristic(self, address: str, char_uuid: str, value: bytes):
+        client = self._clients[address]
+        await client.write_gatt_char(char_uuid, value)
+        self._emit("characteristic_write_ack", address, char_uuid)
+
+    def start_notify(self, address: str, char_uuid: str):
+        if address not in self._clients:
+            self._emit("error_occurred", f"{address} は接続されていません。")
+            return
+        self._submit("start_notify", self._perform_start_notify(address, char_uuid), "通知開始エラー", self._adapters.loop_for(address))
+
+    # char_specifier にはキャッシュ済みのハンドル (int) を渡せる。省略時は UUID で解決する。
+    async def _perform_start_notify(self, address: str, char_uuid: str, char_specifier: Union[int, str, None] = None):
+        metrics = self._notification_metrics.get(address)
+        if metrics is None:
+            metrics = NotificationMetrics(address, char_uuid)
+            self._notification_metrics[address] = metrics
+        metrics.char_uuid = char_uuid
+        metrics.reset(time.monotonic())
+        self._ensure_rate_flush()
+
+        # 通知ごとに呼ばれるホットパス。計測とボタン処理をその場で済ませ、
+        # UI 向けのレート通知は _rate_flush_loop がまとめて送る。
+        handle_button = self._handle_early_press_button
+        handle_sync_echo = self._on_sync_echo
+        monotonic = time.monotonic
+        estimator = self._clock_sync.setdefault(address, ClockOffsetEstimator())
+        unpack_device_time = struct.Struct("<Q").unpack_from
+        press_frame_size = struct.calcsize(PRESS_FRAME_FORMAT)
+        echo_frame_size = struct.calcsize(SYNC_ECHO_FORMAT)
+
+        def _notification_handler(sender: Any, data: bytearray):
+            current_time = monotonic()
+            metrics.record(current_time)
+            if not data:
+                return
+            size = len(data)
+            if data[0] == SYNC_OPCODE and size == echo_frame_size:
+                handle_sync_echo(address, data, current_time)
+                return
+
+            # デバイス時刻付きなら同期済みの推定でホスト時刻に補正して順位を決める
+            device_time = None
+            timestamp = current_time
+            if size >= press_frame_size:
+                device_time = unpack_device_time(data, 1)[0]
+                corrected = estimator.to_host_time(device_time)
+                if corrected is not None:
+                    timestamp = corrected
+            handle_button(address, data[0], timestamp, current_time, device_time)
+
+        target = char_specifier if char_specifier is not None else char_uuid
+        await self._clients[address].start_notify(target, _notification_handler)
+
+    def _ensure_rate_flush(self):
+        # レートの集計タスクは、どのアダプタの接続でも本体のループで1本だけ回す
+        if not self._loop_thread.in_loop_thread():
+            self._loop_thread.call_soon(self._ensure_rate_flush)
+            return
+        if self._rate_flush_task is None or self._rate_flush_task.done():
+            self._rate_flush_task = asyncio.get_running_loop().create_task(self._rate_flush_loop())
+
+    async def _rate_flush_loop(self):
+        while self._notification_metrics:
+            await asyncio.sleep(RATE_UI_INTERVAL)
+            for metrics in list(self._notification_metrics.values()):
+                if metrics.dirty:
+                    metrics.dirty = False
+                    self._emit("notification_rate_updated", metrics.to_dict())
+
+    # --- デバイスとの時刻同期 ---
+    def _start_clock_sync(self, address: str, raise_flag_handle: int):
+        self._stop_clock_sync(address)
+        self._clock_sync.setdefault(address, ClockOffsetEstimator()).reset()
+        self._clock_sync_tasks[address] = asyncio.get_running_loop().create_task(
+            self._clock_sync_loop(address, raise_flag_handle)
+        )
+
+    def _stop_clock_sync(self, address: str):
+        task = self._clock_sync_tasks.pop(address, None)
+        if task is not None:
+            task.cancel()
+        waiter = self._sync_waiters.pop(address, None)
+        if waiter is not None and not waiter[2].done():
+            waiter[2].cancel()
+
+    async def _clock_sync_loop(self, address: str, raise_flag_handle: int):
+        seq = 0
+        sent = 0
+        while address in self._clients:
+            seq = (seq + 1) & 0xFF
+            try:
+                await self._sync_once(address, raise_flag_handle, seq)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._emit("error_occurred", f"時刻同期エラー ({address}): {e}")
+                return
+            sent += 1
+            # 接続直後は短い間隔でサンプルを集め、その後は定期的に追従する
+            await asyncio.sleep(0.05 if sent < CLOCK_SYNC_BURST else CLOCK_SYNC_INTERVAL)
+
+    async def _sync_once(self, address: str, raise_flag_handle: int, seq: int):
+        future = asyncio.get_running_loop().create_future()
+        host_send = time.monotonic()
+        self._sync_waiters[address] = (seq, host_send, future)
+        try:
+            await self._clients[address].write_gatt_char(
+                raise_flag_handle, struct.pack(SYNC_PING_FORMAT, SYNC_OPCODE, seq), response=False
+            )
+            await asyncio.wait_for(future, CLOCK_SYNC_TIMEOUT)
+        finally:
+            self._sync_waiters.pop(address, None)
+
+    def _on_sync_echo(self, address: str, data: bytearray, host_recv: float):
+        waiter = self._sync_waiters.get(address)
+        if waiter is None:
+            return
+        _, seq, device_us = struct.unpack(SYNC_ECHO_FORMAT, data)
+        expected_seq, host_send, future = waiter
+        if seq != expected_seq or future.done():
+            return
+        self._clock_sync[address].add_sample(host_send, device_us, host_recv)
+        future.set_result(None)
+
+    def get_clock_offsets(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            address: {"offset": est.offset, "drift": est.drift, "rtt": est.rtt}
+            for address, est in self._clock_sync.items()
+        }
+
+    # デバイス時刻 (µs) を同期済みの推定でホストの monotonic 秒に換算する。未同期なら None。
+    def device_to_host_time(self, address: str, device_us: int) -> Optional[float]:
+        estimator = self._clock_sync.get(address)
+        return estimator.to_host_time(device_us) if estimator is not None else None
+
+    # --- アドバタイズ押下モード (接続せずに広告で押下を受け取る) ---
+    def start_adv_mode(self):
+        if self._adv_listener is not None:
+            return
+        self._submit("adv_mode", self._perform_adv_mode(), "アドバタイズ受信エラー")
+
+    def stop_adv_mode(self):
+        self._loop_thread.call_soon(self._stop_adv_listener)
+
+    def _stop_adv_listener(self):
+        if self._adv_stop is not None:
+            self._adv_stop.set()
+
+    async def _perform_adv_mode(self):
+        self._adv_stop = asyncio.Event()
+        self._adv_listener = AdvPressListener(
+            on_press=self._on_adv_press,
+            name_filter=self._is_scan_allowed,
+            scanner_cls=self._scanner_cls,
+            scanner_kwargs_list=[slot.kwargs for slot in self._adapters.slots],
+        )
+        self._emit("adv_mode_changed", True)
+        try:
+            await self._adv_listener.run(self._adv_stop)
+        finally:
+            self._adv_listener = None
+            self._adv_stop = None
+            self._emit("adv_mode_changed", False)
+
+    def _on_adv_press(self, address: str, name: Optional[str], button_id: int,
+                      timestamp: float, host_time: float, seq: int):
+        self._handle_early_press_button(address, button_id, timestamp, host_time)
+
+    # --- ローカルの早押し判定 (サーバーを使わない場合) ---
+    def start_local_game(self):
+        self._loop_thread.call_soon(self._reset_local_game, True)
+
+    def stop_local_game(self):
+        self._loop_thread.call_soon(self._reset_local_game, False)
+
+    def _reset_local_game(self, active: bool):
+        with self._press_lock:
+            if active:
+                self._press_ledger.reset()
+                self._winner_address = None
+            journal = self._journal
+            if journal is not None:
+                # 押下と同じ monotonic の時刻で残すので、再生時も開始以降の押下だけが順位に入る
+                if active:
+                    journal.game_start(time.monotonic())
+                elif self._is_game_active:
+                    journal.game_stop()
+            self._is_game_active = active
+        if active:
+            self._emit("early_press_order_updated", [])
+
+    # timestamp は順位付けに使う (補正済み) ホスト時刻、host_time は実際の受信時刻
+    def _handle_early_press_button(
+        self,
+        address: str,
+        button_id: int,
+        timestamp: float,
+        host_time: Optional[float] = None,
+        device_time: Optional[int] = None,
+    ):
+        name = self._connected_target_addresses.get(address)
+        if name is None:
+            listener = self._adv_listener
+            name = listener.names.get(address, UNKNOWN_DEVICE_NAME) if listener is not None else UNKNOWN_DEVICE_NAME
+        if self._forwarder is not None:
+            # 順位はサーバーの台帳が決めるので、ローカルの台帳は使わない
+            self._forwarder.forward(address, button_id, timestamp, host_time, device_time, name)
+            return
+        with self._press_lock:
+            # 1位が決まった後の押下も受け付ける (押下時刻がより早ければ1位が入れ替わる)
+            if not self._is_game_active or address in self._press_ledger:
+                return
+            if self._journal is not None:
+                self._journal.press(address, button_id, timestamp, host_time, device_time)
+            delta = self._press_ledger.add(
+                address, button_id, timestamp, name,
+                host_time=host_time if host_time is not None else timestamp,
+                device_time=device_time,
+            )
+            if delta is None:
+                return
+            winner = None
+            if delta["order"] == 1:  # 1位が入れ替わったら勝者を送り直す
+                self._winner_address = address
+                winner = self._press_ledger.winner
+
+        self._emit("early_press_order_delta", delta)
+        if winner is not None:
+            self._emit("early_press_winner", winner)
+
+    def stop_notify(self, address: str, char_uuid: str):
+        if address not in self._clients:
+            self._emit("error_occurred", f"{address} は接続されていません。")
+            return
+        self._submit("stop_notify", self._perform_stop_notify(address, char_uuid), "通知停止エラー", self._adapters.loop_for(address))
+
+    async def _perform_stop_notify(self, address: str, char_uuid: str):
+        await self._clients[address].stop_notify(char_uuid)
+        if address in self._notification_metrics:
+            del self._notification_metrics[address]
+
+    async def _perform_cleanup(self):
+        self._closing = True
+        self._stop_adv_listener()
+        await asyncio.gather(
+            *(self._run_on(slot.loop_thread, self._disconnect_adapter(slot)) for slot in self._adapters.slots),
+            return_exceptions=True,
+        )
+
+    # アダプタのループ上で、そのアダプタに割り当てたデバイスの再接続を止めて切断する
+    async def _disconnect_adapter(self, slot: AdapterSlot):
+        addresses = [a for a in self._clients if self._adapters.slot_for(a) is slot]
+        for address in [a for a in self._reconnect_tasks if self._adapters.slot_for(a) is slot]:
+            self._stop_reconnect(address)
+        tasks = [self._clients[a].disconnect() for a in addresses if self._clients[a].is_connected]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def cleanup(self):
+        print("BLEワーカークリーンアップ中...")
+        if self._loop_thread.is_running():
+            # 終了処理だけは切断完了を待ってからループを止める
+            try:
+                self._loop_thread.submit(self._perform_cleanup()).result(timeout=10.0)
+            except Exception as e:
+                print(f"クリーンアップ中のエラー: {e}")
+            self._loop_thread.stop()
+        self._adapters.stop()
+        self._rate_flush_task = None
+        self._clock_sync_tasks.clear()
+        self._reconnect_tasks.clear()
+        self._link_stats.clear()
+        self._sync_waiters.clear()
+        self._clock_sync.clear()
+        self._pending_connects.clear()
+        self._clients.clear()
+        self._connected_target_addresses.clear()
+        self._notification_metrics.clear()
+        self._press_ledger.reset()
+        self._is_game_active = False
+        self._winner_address = None
+        self._closing = False
+        print("クリーンアップ完了。")
+
+    def set_journal(self, journal):
+        self._journal = journal
+
+    def set_forwarder(self, forwarder):
+        self._forwarder = forwarder
+
+    def set_allowed_device_name(self, name: Optional[str]):
+        self.allowed_device_name = name
+
+    def set_target_device_names(self, names: List[str]):
+        if len(names) > self.max_devices:
+            raise ValueError(f"最大接続台数は{self.max_devices}台です。")
+        self.target_device_names = [name for name in names if name]
+    
+    def get_connected_targets(self) -> Dict[str, str]:
+        return self._connected_target_addresses.copy()
+
+    # アダプタ名 -> 接続 (予約) 中の台数
+    def get_adapter_load(self) -> Dict[str, int]:
+        return self._adapters.load()
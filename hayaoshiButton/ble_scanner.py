@@ -0,0 +1,69 @@
+# ble_scanner.py
+
+import asyncio
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+DeviceInfo = Dict[str, Any]
+
+
+# 広告を受信するたびにコールバックするスキャナー。
+# アドレスで重複を除き、RSSI はその場で更新する。
+# expected_names がすべて見つかるか stop_predicate が真になった時点で終了する。
+class StreamingScanner:
+    def __init__(
+        self,
+        on_device: Callable[[DeviceInfo], None],
+        name_filter: Optional[Callable[[Optional[str]], bool]] = None,
+        expected_names: Optional[Iterable[str]] = None,
+        stop_predicate: Optional[Callable[[Dict[str, DeviceInfo]], bool]] = None,
+        scanner_cls: Optional[Callable[..., Any]] = None,
+        scanner_kwargs: Optional[Dict[str, Any]] = None,
+    ):
+        self.devices: Dict[str, DeviceInfo] = {}
+        self._on_device = on_device
+        self._name_filter = name_filter
+        self._missing_names = set(expected_names or [])
+        self._wait_for_names = bool(self._missing_names)
+        self._stop_predicate = stop_predicate
+        self._scanner_cls = scanner_cls  # None なら bleak を使う (最初のスキャンで読み込む)
+        self._scanner_kwargs = scanner_kwargs or {}  # adapter="hci1" など
+        self._done: Optional[asyncio.Event] = None
+
+    def _on_detection(self, device, advertisement_data):
+        name = advertisement_data.local_name or device.name
+        if self._name_filter is not None and not self._name_filter(name):
+            return
+
+        rssi = advertisement_data.rssi
+        info = self.devices.get(device.address)
+        if info is None:
+            info = {"address": device.address, "name": name or "Unknown", "rssi": rssi}
+            self.devices[device.address] = info
+        elif info["rssi"] == rssi:
+            return
+        else:
+            info["rssi"] = rssi
+        self._on_device(dict(info))
+
+        if name:
+            self._missing_names.discard(name)
+        if self._wait_for_names and not self._missing_names:
+            self._done.set()
+        elif self._stop_predicate is not None and self._stop_predicate(self.devices):
+            self._done.set()
+
+    async def run(self, timeout: float) -> List[DeviceInfo]:
+        self._done = asyncio.Event()
+        scanner_cls = self._scanner_cls
+        if scanner_cls is None:
+            from bleak import BleakScanner as scanner_cls
+        scanner = scanner_cls(detection_callback=self._on_detection, **self._scanner_kwargs)
+        await scanner.start()
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            await scanner.stop()
+        return [dict(info) for info in self.devices.values()]
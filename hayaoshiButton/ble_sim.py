@@ -0,0 +1,577 @@
+# ble_sim.py
+#
+# Bluetooth アダプタも ESP32 も無い環境で BleCore を動かすための疑似 bleak バックエンド。
+# BleCore(client_cls=backend.client_cls, scanner_cls=backend.scanner_cls) で差し替えて使う (Qt は不要)。
+# 単体で実行すると、疑似デバイスを使った負荷試験と早押し判定の公平性測定を行う。
+
+import argparse
+import asyncio
+import json
+import random
+import struct
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from constants import (
+    ADV_COMPANY_ID,
+    ADV_PRESS_VERSION,
+    ADV_PRESS_FORMAT,
+    ESP32_SERVICE_UUID,
+    ESP32_CHAR_UUID_NOTIFY,
+    ESP32_CHAR_UUID_RAISE_FLAG,
+    PRESS_FRAME_FORMAT,
+    SYNC_OPCODE,
+    SYNC_ECHO_FORMAT,
+)
+
+NOTIFY_HANDLE = 0x2A
+RAISE_FLAG_HANDLE = 0x2D
+
+
+# --- GATT 構造の疑似実装 (bleak の BleakGATTServiceCollection 相当) ---
+class SimCharacteristic:
+    def __init__(self, uuid: str, handle: int, properties: List[str]):
+        self.uuid = uuid
+        self.handle = handle
+        self.properties = properties
+        self.description = "Simulated Characteristic"
+
+
+class SimService:
+    def __init__(self, uuid: str, characteristics: List[SimCharacteristic]):
+        self.uuid = uuid
+        self.description = "Simulated ESP32 Service"
+        self.characteristics = characteristics
+
+    def get_characteristic(self, specifier: Any) -> Optional[SimCharacteristic]:
+        for char in self.characteristics:
+            if char.handle == specifier or char.uuid.lower() == str(specifier).lower():
+                return char
+        return None
+
+
+class SimServiceCollection:
+    def __init__(self, services: List[SimService]):
+        self._services = services
+
+    def __iter__(self):
+        return iter(self._services)
+
+    def get_service(self, specifier: Any) -> Optional[SimService]:
+        for service in self._services:
+            if service.uuid.lower() == str(specifier).lower():
+                return service
+        return None
+
+    def get_characteristic(self, specifier: Any) -> Optional[SimCharacteristic]:
+        for service in self._services:
+            char = service.get_characteristic(specifier)
+            if char is not None:
+                return char
+        return None
+
+
+def _esp32_services() -> SimServiceCollection:
+    return SimServiceCollection([
+        SimService(ESP32_SERVICE_UUID, [
+            SimCharacteristic(ESP32_CHAR_UUID_NOTIFY, NOTIFY_HANDLE, ["notify"]),
+            SimCharacteristic(ESP32_CHAR_UUID_RAISE_FLAG, RAISE_FLAG_HANDLE, ["write", "write-without-response"]),
+        ])
+    ])
+
+
+class SimBLEDevice:
+    def __init__(self, address: str, name: str):
+        self.address = address
+        self.name = name
+
+
+class SimAdvertisementData:
+    def __init__(self, local_name: str, rssi: int, manufacturer_data: Optional[Dict[int, bytes]] = None):
+        self.local_name = local_name
+        self.rssi = rssi
+        self.manufacturer_data = manufacturer_data or {}
+        self.service_uuids = [ESP32_SERVICE_UUID]
+
+
+# 疑似 ESP32 ボタン1台分。
+# 時計はホストの monotonic に対してオフセットとドリフトを持ち、
+# 押下から通知が届くまでには接続間隔ぶんのランダムな遅延が乗る。
+class SimulatedDevice:
+    def __init__(
+        self,
+        address: str,
+        name: str,
+        rate_hz: float = 100.0,
+        jitter_ms: float = 0.0,
+        conn_interval_ms: float = 15.0,
+        rssi: int = -55,
+        clock_offset_s: Optional[float] = None,
+        clock_drift_ppm: float = 0.0,
+        connect_latency: float = 0.05,
+        adv_interval: float = 0.1,
+        button_id: int = 1,
+        send_device_time: bool = True,
+        trace: Optional[List[Tuple[float, bytes]]] = None,
+    ):
+        self.address = address
+        self.name = name
+        self.rate_hz = rate_hz
+        self.jitter = jitter_ms / 1000
+        self.conn_interval = conn_interval_ms / 1000
+        self.rssi = rssi
+        self.clock_offset_s = clock_offset_s if clock_offset_s is not None else random.uniform(1.0, 1000.0)
+        self.clock_drift = clock_drift_ppm * 1e-6
+        self.connect_latency = connect_latency
+        self.adv_interval = adv_interval
+        self.button_id = button_id
+        self.send_device_time = send_device_time
+        self.trace = trace
+        self.streaming = True  # False の間は schedule_press() のときだけ送る
+        self.press_log: List[Tuple[float, float]] = []  # (実際に押した時刻, 通知が届いた時刻)
+        self.client: Optional["SimulatedBleakClient"] = None
+        self.adv_seq = 0
+        self.adv_pressed_at: Optional[float] = None  # アドバタイズ押下モードで最後に押した時刻
+
+    def device_time_us(self, host_time: float) -> int:
+        return int((host_time * (1.0 + self.clock_drift) + self.clock_offset_s) * 1_000_000)
+
+    # 接続イベントのどこで押されたかで、届くまでの遅延が 0〜接続間隔 の間でばらつく
+    def link_latency(self) -> float:
+        latency = random.uniform(0.0, self.conn_interval)
+        if self.jitter:
+            latency += random.uniform(0.0, self.jitter)
+        return latency
+
+    def press_frame(self, press_time: float) -> bytearray:
+        if self.send_device_time:
+            return bytearray(struct.pack(PRESS_FRAME_FORMAT, self.button_id, self.device_time_us(press_time)))
+        return bytearray([self.button_id])
+
+    # 任意のスレッドから呼べる。at_host_time (monotonic) に押したことにする。
+    def schedule_press(self, at_host_time: float):
+        client = self.client
+        if client is not None and client._loop is not None:
+            client._loop.call_soon_threadsafe(client._schedule_press, at_host_time)
+
+    # アドバタイズ押下モード用。at_host_time に押したことにして、以降の広告に載せる。
+    def press_adv(self, at_host_time: float):
+        self.adv_pressed_at = at_host_time
+        self.adv_seq = (self.adv_seq + 1) & 0xFFFF
+        self.press_log.append((at_host_time, at_host_time))
+
+    def manufacturer_data(self, now: float) -> Dict[int, bytes]:
+        pressed_at = self.adv_pressed_at
+        if pressed_at is None or now < pressed_at:
+            return {}
+        age_ms = min(0xFFFF, int((now - pressed_at) * 1000))
+        return {ADV_COMPANY_ID: struct.pack(ADV_PRESS_FORMAT, ADV_PRESS_VERSION, self.button_id, self.adv_seq, age_ms)}
+
+    # 任意のスレッドから呼べる。接続が切れたことにする。
+    def drop_link(self):
+        client = self.client
+        if client is not None and client._loop is not None:
+            client._loop.call_soon_threadsafe(client._drop_link)
+
+
+class SimulatedBleakClient:
+    def __init__(
+        self,
+        backend: "SimulatedBackend",
+        address_or_device: Any,
+        services: Optional[List[str]] = None,
+        disconnected_callback: Optional[Callable[["SimulatedBleakClient"], None]] = None,
+        **kwargs: Any,
+    ):
+        address = getattr(address_or_device, "address", address_or_device)
+        self.address = address
+        self._backend = backend
+        self._device = backend.devices.get(address)
+        self._disconnected_callback = disconnected_callback
+        self._connected = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._callback: Optional[Callable[..., Any]] = None
+        self._notify_char: Optional[SimCharacteristic] = None
+        self._stream_task: Optional[asyncio.Task] = None
+        self.services = _esp32_services()
+
+    @property
+    def is_connected(self) -> bool:
+        return self._connected
+
+    def set_disconnected_callback(self, callback: Optional[Callable[["SimulatedBleakClient"], None]]):
+        self._disconnected_callback = callback
+
+    async def connect(self, **kwargs: Any) -> bool:
+        if self._device is None:
+            raise Exception(f"デバイス {self.address} が見つかりませんでした。")
+        await asyncio.sleep(self._device.connect_latency)
+        self._loop = asyncio.get_running_loop()
+        self._connected = True
+        self._device.client = self
+        return True
+
+    async def disconnect(self) -> bool:
+        self._teardown()
+        return True
+
+    def _teardown(self):
+        self._connected = False
+        self._callback = None
+        if self._stream_task is not None:
+            self._stream_task.cancel()
+            self._stream_task = None
+        if self._device is not None and self._device.client is self:
+            self._device.client = None
+
+    def _drop_link(self):
+        if not self._connected:
+            return
+        self._teardown()
+        if self._disconnected_callback is not None:
+            self._disconnected_callback(self)
+
+    def _require_connected(self):
+        if not self._connected:
+            raise Exception(f"{self.address} は接続されていません。")
+
+    async def start_notify(self, char_specifier: Any, callback: Callable[..., Any], **kwargs: Any):
+        self._require_connected()
+        char = self.services.get_characteristic(getattr(char_specifier, "handle", char_specifier))
+        if char is None or "notify" not in char.properties:
+            raise Exception(f"通知できないキャラクタリスティックです: {char_specifier}")
+        self._notify_char = char
+        self._callback = callback
+        if self._stream_task is None:
+            self._stream_task = asyncio.get_running_loop().create_task(self._stream())
+
+    async def stop_notify(self, char_specifier: Any):
+        self._callback = None
+        if self._stream_task is not None:
+            self._stream_task.cancel()
+            self._stream_task = None
+
+    async def read_gatt_char(self, char_specifier: Any, **kwargs: Any) -> bytearray:
+        self._require_connected()
+        return bytearray([0])
+
+    async def write_gatt_char(self, char_specifier: Any, data: Any, response: bool = False):
+        self._require_connected()
+        char = self.services.get_characteristic(getattr(char_specifier, "handle", char_specifier))
+        if char is None:
+            raise Exception(f"書き込めないキャラクタリスティックです: {char_specifier}")
+        data = bytes(data)
+        if char.handle == RAISE_FLAG_HANDLE and len(data) >= 2 and data[0] == SYNC_OPCODE:
+            # ping を受け取った瞬間のデバイス時刻を返す
+            device = self._device
+            uplink = device.link_latency()
+            received_at = time.monotonic() + uplink
+            echo = bytearray(struct.pack(SYNC_ECHO_FORMAT, SYNC_OPCODE, data[1], device.device_time_us(received_at)))
+            self._loop.call_later(uplink + device.link_latency(), self._deliver, echo)
+
+    def _deliver(self, data: bytearray):
+        callback = self._callback
+        if callback is None:
+            return
+        backend = self._backend
+        backend.delivered += 1
+        if backend.measure_handler:
+            started = time.perf_counter()
+            result = callback(self._notify_char, data)
+            backend.handler_times.append(time.perf_counter() - started)
+        else:
+            result = callback(self._notify_char, data)
+        if asyncio.iscoroutine(result):
+            self._loop.create_task(result)
+
+    def _schedule_press(self, at_host_time: float):
+        device = self._device
+        arrival = at_host_time + device.link_latency()
+        device.press_log.append((at_host_time, arrival))
+        self._loop.call_later(max(0.0, arrival - time.monotonic()), self._deliver, device.press_frame(at_host_time))
+
+    async def _stream(self):
+        device = self._device
+        loop = asyncio.get_running_loop()
+        if device.trace:
+            start = time.monotonic()
+            for offset, data in device.trace:
+                await asyncio.sleep(max(0.0, start + offset - time.monotonic()))
+                self._deliver(bytearray(data))
+            return
+
+        period = 1.0 / device.rate_hz if device.rate_hz > 0 else 0.0
+        if period == 0.0:
+            return
+        next_time = time.monotonic()
+        while self._connected:
+            next_time += period
+            await asyncio.sleep(max(0.0, next_time - time.monotonic()))
+            if device.streaming:
+                loop.call_later(device.link_latency(), self._deliver, device.press_frame(next_time))
+
+
+class SimulatedBleakScanner:
+    def __init__(
+        self,
+        backend: "SimulatedBackend",
+        detection_callback: Optional[Callable[[Any, Any], None]] = None,
+        **kwargs: Any,
+    ):
+        self._backend = backend
+        self._callback = detection_callback
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._advertise(d)) for d in self._backend.devices.values()]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _advertise(self, device: SimulatedDevice):
+        await asyncio.sleep(random.uniform(0.0, device.adv_interval))
+        ble_device = SimBLEDevice(device.address, device.name)
+        while True:
+            if self._callback is not None:
+                self._callback(ble_device, SimAdvertisementData(
+                    device.name,
+                    device.rssi + random.randint(-3, 3),
+                    device.manufacturer_data(time.monotonic()),
+                ))
+            await asyncio.sleep(device.adv_interval)
+
+
+class SimulatedBackend:
+    def __init__(self, devices: List[SimulatedDevice]):
+        self.devices: Dict[str, SimulatedDevice] = {d.address: d for d in devices}
+        self.delivered = 0
+        self.measure_handler = False
+        self.handler_times: List[float] = []  # 通知コールバック1回あたりの処理時間 (秒)
+
+    def client_cls(self, address_or_device: Any, **kwargs: Any) -> SimulatedBleakClient:
+        return SimulatedBleakClient(self, address_or_device, **kwargs)
+
+    def scanner_cls(self, **kwargs: Any) -> SimulatedBleakScanner:
+        return SimulatedBleakScanner(self, **kwargs)
+
+    @staticmethod
+    def address_for(index: int) -> str:
+        return f"5E:00:00:00:{(index >> 8) & 0xFF:02X}:{index & 0xFF:02X}"
+
+    @classmethod
+    def synthetic(cls, count: int, **device_kwargs: Any) -> "SimulatedBackend":
+        return cls([
+            SimulatedDevice(cls.address_for(i), f"SIM-BUTTON-{i + 1:03d}", button_id=(i % 250) + 1, **device_kwargs)
+            for i in range(count)
+        ])
+
+    # 1行1通知の JSON Lines: {"address": ..., "name": ..., "t": 開始からの秒, "data": "16進文字列"}
+    @classmethod
+    def from_trace(cls, path: str, **device_kwargs: Any) -> "SimulatedBackend":
+        traces: Dict[str, Dict[str, Any]] = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                entry = traces.setdefault(record["address"], {"name": record.get("name"), "frames": []})
+                entry["frames"].append((float(record["t"]), bytes.fromhex(record["data"])))
+        devices = []
+        for i, (address, entry) in enumerate(traces.items()):
+            frames = sorted(entry["frames"], key=lambda f: f[0])
+            name = entry["name"] or f"TRACE-BUTTON-{i + 1:03d}"
+            devices.append(SimulatedDevice(address, name, trace=frames, **device_kwargs))
+        return cls(devices)
+
+
+# --- 負荷試験・公平性測定 ---
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+# adapters に2以上を渡すと、疑似アダプタごとに別ループで動かす (複数アダプタ構成の負荷試験)
+def connect_worker(backend: SimulatedBackend, concurrency: int = 32, timeout: float = 30.0, adapters: int = 1):
+    from ble_core import BleCore
+    from gatt_cache import GattCache
+
+    names = [device.name for device in backend.devices.values()]
+    worker = BleCore(
+        max_devices=len(names),
+        client_cls=backend.client_cls,
+        scanner_cls=backend.scanner_cls,
+        gatt_cache=GattCache(path=None),
+        adapters=[f"sim{i}" for i in range(adapters)] if adapters > 1 else [],
+        per_adapter_limit=len(names),
+    )
+    worker.set_target_device_names(names)
+    finished = threading.Event()
+    results: Dict[str, Optional[str]] = {}
+
+    def _on_finished(r):
+        results.update(r)
+        finished.set()
+
+    worker.on("connect_all_finished", _on_finished)
+    started = time.perf_counter()
+    worker.connect_all_targets(max_concurrency=concurrency, timeout=timeout)
+    if not finished.wait(timeout + 10.0):
+        raise RuntimeError("疑似デバイスへの接続が終わりませんでした。")
+    connect_seconds = time.perf_counter() - started
+    failed = {name: message for name, message in results.items() if message is not None}
+    return worker, connect_seconds, failed
+
+
+def measure_throughput(backend: SimulatedBackend, duration: float) -> Dict[str, Any]:
+    for device in backend.devices.values():
+        device.streaming = True
+    backend.handler_times = []
+    backend.measure_handler = True
+    delivered_before = backend.delivered
+    time.sleep(duration)
+    backend.measure_handler = False
+    delivered = backend.delivered - delivered_before
+    handler_us = [t * 1_000_000 for t in backend.handler_times]
+    return {
+        "notifications": delivered,
+        "throughput_per_s": delivered / duration,
+        "handler_us_p50": percentile(handler_us, 50),
+        "handler_us_p99": percentile(handler_us, 99),
+        "handler_us_p999": percentile(handler_us, 99.9),
+    }
+
+
+# 全デバイスがほぼ同時に押すラウンドを繰り返し、判定された1位が本当に最初に押したデバイスかを数える
+def measure_fairness(worker, backend: SimulatedBackend, rounds: int, spread_ms: float) -> Dict[str, Any]:
+    for device in backend.devices.values():
+        device.streaming = False
+    time.sleep(0.1)
+
+    winners: List[Dict[str, Any]] = []
+    winner_event = threading.Event()
+
+    def _on_winner(winner):
+        winners.append(winner)
+        winner_event.set()
+
+    worker.on("early_press_winner", _on_winner)
+    correct = 0
+    max_latency = max(d.conn_interval + d.jitter for d in backend.devices.values())
+    try:
+        for _ in range(rounds):
+            winner_event.clear()
+            worker.start_local_game()
+            time.sleep(0.02)
+            base = time.monotonic() + 0.05
+            press_times = {}
+            for device in backend.devices.values():
+                press_times[device.address] = base + random.uniform(0.0, spread_ms / 1000)
+                device.schedule_press(press_times[device.address])
+            winner_event.wait(spread_ms / 1000 + max_latency + 1.0)
+            time.sleep(max_latency + spread_ms / 1000)
+            worker.stop_local_game()
+            expected = min(press_times, key=press_times.get)
+            if winners and winners[-1]["address"] == expected:
+                correct += 1
+    finally:
+        worker.off("early_press_winner", _on_winner)
+    synced = sum(1 for info in worker.get_clock_offsets().values() if info["offset"] is not None)
+    return {
+        "rounds": rounds,
+        "correct_winners": correct,
+        "fairness": correct / rounds if rounds else 0.0,
+        "synced_devices": synced,
+    }
+
+
+# 時計がずれていく疑似デバイスについて、推定で換算したデバイス時刻と実際のホスト時刻の差を測る
+def measure_clock_error(worker, backend: SimulatedBackend) -> Dict[str, Any]:
+    now = time.monotonic()
+    offsets = worker.get_clock_offsets()
+    errors_ms: List[float] = []
+    drift_error_ppm: List[float] = []
+    for address, device in backend.devices.items():
+        host_time = worker.device_to_host_time(address, device.device_time_us(now))
+        if host_time is None:
+            continue
+        errors_ms.append(abs(host_time - now) * 1000)
+        drift_error_ppm.append(abs(offsets[address]["drift"] - device.clock_drift) * 1e6)
+    return {
+        "synced_devices": len(errors_ms),
+        "error_ms_p50": percentile(errors_ms, 50),
+        "error_ms_max": max(errors_ms) if errors_ms else 0.0,
+        "drift_error_ppm_max": max(drift_error_ppm) if drift_error_ppm else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="疑似 BLE デバイスで BleCore の負荷と早押し判定の公平性を測る")
+    parser.add_argument("--devices", type=int, default=4, help="疑似デバイス数")
+    parser.add_argument("--rate", type=float, default=100.0, help="1台あたりの通知レート (Hz)")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="通知遅延に加える追加ジッター (ms)")
+    parser.add_argument("--conn-interval-ms", type=float, default=15.0, help="BLE 接続間隔 (ms)")
+    parser.add_argument("--drift-ppm", type=float, default=20.0, help="デバイス時計のドリフト (ppm)")
+    parser.add_argument("--legacy-frames", action="store_true", help="デバイス時刻なしの1byte通知を送る")
+    parser.add_argument("--adapters", type=int, default=1, help="疑似 Bluetooth アダプタ数 (アダプタごとに別ループ)")
+    parser.add_argument("--trace", help="再生する通知トレース (JSON Lines)")
+    parser.add_argument("--duration", type=float, default=5.0, help="スループット測定時間 (秒)")
+    parser.add_argument("--rounds", type=int, default=20, help="公平性測定のラウンド数")
+    parser.add_argument("--spread-ms", type=float, default=20.0, help="1ラウンド内で押下時刻がばらつく幅 (ms)")
+    parser.add_argument("--json", help="結果を書き出す JSON ファイル")
+    args = parser.parse_args()
+
+    device_kwargs = {
+        "rate_hz": args.rate,
+        "jitter_ms": args.jitter_ms,
+        "conn_interval_ms": args.conn_interval_ms,
+        "clock_drift_ppm": args.drift_ppm,
+        "send_device_time": not args.legacy_frames,
+    }
+    if args.trace:
+        backend = SimulatedBackend.from_trace(args.trace, **device_kwargs)
+    else:
+        backend = SimulatedBackend.synthetic(args.devices, **device_kwargs)
+
+    worker, connect_seconds, failed = connect_worker(backend, adapters=args.adapters)
+    try:
+        result: Dict[str, Any] = {
+            "devices": len(backend.devices),
+            "adapters": args.adapters,
+            "connect_seconds": connect_seconds,
+            "connect_failures": len(failed),
+        }
+        print(f"{len(backend.devices)} 台に {connect_seconds:.2f} 秒で接続 (失敗 {len(failed)} 台)")
+        result["throughput"] = measure_throughput(backend, args.duration)
+        t = result["throughput"]
+        print(f"通知 {t['notifications']} 件 / {args.duration:.1f} 秒 = {t['throughput_per_s']:.0f} 件/秒, "
+              f"ハンドラ p50 {t['handler_us_p50']:.1f} µs / p99 {t['handler_us_p99']:.1f} µs")
+        if not args.trace and args.rounds > 0:
+            result["fairness"] = measure_fairness(worker, backend, args.rounds, args.spread_ms)
+            f = result["fairness"]
+            print(f"公平性: {f['correct_winners']} / {f['rounds']} ラウンドで正しい1位 "
+                  f"({f['fairness'] * 100:.0f}%), 時刻同期済み {f['synced_devices']} 台")
+        if not args.legacy_frames:
+            result["clock"] = measure_clock_error(worker, backend)
+            c = result["clock"]
+            print(f"時刻同期: 換算誤差 p50 {c['error_ms_p50']:.3f} ms / 最大 {c['error_ms_max']:.3f} ms, "
+                  f"ドリフト推定誤差 最大 {c['drift_error_ppm_max']:.1f} ppm ({c['synced_devices']} 台)")
+        if failed:
+            print(f"接続に失敗したデバイス: {failed}")
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as fp:
+                json.dump(result, fp, ensure_ascii=False, indent=2)
+    finally:
+        worker.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# circuit_breaker.py
+
+import threading
+import time
+from typing import Any, Callable, Tuple, Type
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+# 連続で失敗したら一定時間は呼び出しを試みずに即座に失敗させる。
+# reset_timeout 経過後は1回だけ試し (half-open)、成功すれば元に戻る。
+# ignored に挙げた例外 (未登録の名前など、DB は応答できている失敗) は失敗に数えない。
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        reset_timeout: float = 10.0,
+        ignored: Tuple[Type[BaseException], ...] = (),
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.ignored = ignored
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._failures >= self.failure_threshold
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._failures < self.failure_threshold:
+                return True
+            if self._trial_in_flight or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    def call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        if not self.allow():
+            raise CircuitOpenError("データベースに接続できないため処理をスキップしました。")
+        try:
+            result = fn(*args, **kwargs)
+        except self.ignored:
+            self.record_success()
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
@@ -0,0 +1,97 @@
+# clock_sync.py
+
+from collections import deque
+from typing import Optional
+
+from constants import (
+    CLOCK_SYNC_WINDOW,
+    CLOCK_DRIFT_BUCKET,
+    CLOCK_DRIFT_HISTORY,
+    CLOCK_DRIFT_MIN_SPAN,
+    CLOCK_MAX_DRIFT,
+)
+
+
+# ESP32 のマイクロ秒カウンタとホストの time.monotonic() の対応を推定する。
+# ping/echo の往復ごとに (送信時刻, デバイス時刻, 受信時刻) を1サンプルとし、
+# オフセットは直近 window 個のうち往復時間が短い (= 信頼できる) サンプルから求める。
+# ドリフトは数十秒の窓では往復の揺らぎ (数 ms) に埋もれて桁違いに大きく出るので、
+# bucket 秒ごとに往復最短のサンプルを1つずつ長期の履歴に残し、その履歴が
+# CLOCK_DRIFT_MIN_SPAN 秒以上にわたってから直線回帰の傾きとして求める (それまではオフセットだけ)。
+class ClockOffsetEstimator:
+    def __init__(
+        self,
+        window: int = CLOCK_SYNC_WINDOW,
+        bucket: float = CLOCK_DRIFT_BUCKET,
+        history: int = CLOCK_DRIFT_HISTORY,
+    ):
+        self._samples = deque(maxlen=max(2, window))  # (host_mid, offset, rtt)
+        self._bucket = bucket
+        self._history = deque(maxlen=max(2, history))  # bucket ごとの往復最短サンプル
+        self.offset: Optional[float] = None  # ref_host 時点での デバイス秒 - ホスト秒
+        self.drift = 0.0                     # オフセットの変化率 (秒/秒)
+        self.rtt: Optional[float] = None     # 採用サンプル中の最小往復時間 (秒)
+        self._ref_host = 0.0
+
+    @property
+    def synced(self) -> bool:
+        return self.offset is not None
+
+    def reset(self):
+        self._samples.clear()
+        self._history.clear()
+        self.offset = None
+        self.drift = 0.0
+        self.rtt = None
+
+    def add_sample(self, host_send: float, device_us: int, host_recv: float):
+        rtt = host_recv - host_send
+        if rtt < 0:
+            return
+        host_mid = (host_send + host_recv) / 2
+        sample = (host_mid, device_us / 1_000_000 - host_mid, rtt)
+        self._samples.append(sample)
+        self._add_to_history(sample)
+        self._update()
+
+    def _add_to_history(self, sample):
+        history = self._history
+        # 同じ bucket の中では往復が最短のものだけを残す
+        if history and int(sample[0] // self._bucket) == int(history[-1][0] // self._bucket):
+            if sample[2] < history[-1][2]:
+                history[-1] = sample
+            return
+        history.append(sample)
+
+    def _fit_drift(self) -> float:
+        history = self._history
+        if len(history) < 2 or history[-1][0] - history[0][0] < CLOCK_DRIFT_MIN_SPAN:
+            return 0.0
+        n = len(history)
+        mean_host = sum(s[0] for s in history) / n
+        mean_offset = sum(s[1] for s in history) / n
+        var = sum((s[0] - mean_host) ** 2 for s in history)
+        if var <= 0:
+            return 0.0
+        drift = sum((s[0] - mean_host) * (s[1] - mean_offset) for s in history) / var
+        return max(-CLOCK_MAX_DRIFT, min(CLOCK_MAX_DRIFT, drift))
+
+    def _update(self):
+        samples = sorted(self._samples, key=lambda s: s[2])
+        # 往復が短いほど行きと帰りの非対称による誤差 (最大 rtt/2) が小さいので、上位 1/4 だけを使う
+        best = samples[:max(2, len(samples) // 4)]
+        self.rtt = best[0][2]
+        self.drift = self._fit_drift()
+        # 各サンプルのオフセットをドリフトで基準時刻 (採用サンプルの平均時刻) にそろえてから平均する
+        n = len(best)
+        mean_host = sum(s[0] for s in best) / n
+        self._ref_host = mean_host
+        self.offset = sum(s[1] - self.drift * (s[0] - mean_host) for s in best) / n
+
+    # デバイス時刻 (µs) をホストの monotonic 秒に換算する。未同期なら None。
+    def to_host_time(self, device_us: int) -> Optional[float]:
+        if self.offset is None:
+            return None
+        # device = host + offset + drift * (host - ref) を host について解く
+        device_s = device_us / 1_000_000
+        return (device_s - self.offset + self.drift * self._ref_host) / (1.0 + self.drift)
@@ -1,9 +1,78 @@
 # constants.py
 
-MAX_ALLOWED_DEVICES = 4  # 最大接続可能デバイス数
+import os
+
+MAX_ALLOWED_DEVICES = int(os.environ.get("HAYAOSHI_MAX_DEVICES", "4"))  # 最大接続可能デバイス数
+PLAYER_NAME_MAX_LENGTH = 100  # プレイヤー名の最大文字数 (models.Player.name の列幅)
 RATE_BUFFER_SIZE = 10    # 通知レート計算に使う履歴数
+RATE_UI_INTERVAL = 0.25  # 通知レートを GUI へ送る間隔 (秒)
+SCAN_TIMEOUT = 5.0       # スキャン時間 (秒)
+CONNECT_CONCURRENCY = 4  # 一括接続時の同時接続数
+CONNECT_TIMEOUT = 15.0   # 1台あたりの接続〜通知開始までのタイムアウト (秒)
+GATT_CACHE_PATH = "gatt_cache.json"  # GATT ハンドルのキャッシュファイル
 
 # ESP32のサービスUUIDとキャラクタリスティックUUID（例）
 ESP32_SERVICE_UUID = "0000abcd-0000-1000-8000-00805f9b34fb"
 ESP32_CHAR_UUID_NOTIFY = "0000dcba-0000-1000-8000-00805f9b34fb"
 ESP32_CHAR_UUID_RAISE_FLAG = "0000ef12-0000-1000-8000-00805f9b34fb"
+
+# 通知ペイロード: [ボタンID (1byte)] [デバイス時刻 µs (uint64 LE)]
+# 1byte だけの旧形式も受け付ける (その場合はホスト受信時刻で判定)
+PRESS_FRAME_FORMAT = "<BQ"
+
+# 時刻同期: RAISE_FLAG に [SYNC_OPCODE, seq] を書き込むと、
+# デバイスは通知で [SYNC_OPCODE, seq, デバイス時刻 µs (uint64 LE)] を返す
+SYNC_OPCODE = 0xA5  # ボタンIDとしては使わない値
+SYNC_PING_FORMAT = "<BB"
+SYNC_ECHO_FORMAT = "<BBQ"
+CLOCK_SYNC_INTERVAL = 1.0  # 時刻同期の間隔 (秒)
+CLOCK_SYNC_BURST = 32      # 接続直後にまとめて送る ping の数
+CLOCK_SYNC_TIMEOUT = 0.5   # echo 待ちのタイムアウト (秒)
+CLOCK_SYNC_WINDOW = 32     # オフセット推定に使うサンプル数
+CLOCK_DRIFT_BUCKET = 10.0    # ドリフト推定用に、この秒数ごとに往復最短のサンプルを1つ残す
+CLOCK_DRIFT_HISTORY = 60     # ドリフト推定用に残すサンプル数 (10 秒 × 60 = 直近 10 分)
+CLOCK_DRIFT_MIN_SPAN = 60.0  # ドリフトを推定するのに必要なサンプルの時間幅 (秒)
+CLOCK_MAX_DRIFT = 100e-6     # 推定ドリフトの上限 (ESP32 の水晶の誤差として現実的な範囲)
+
+# イベントジャーナル
+JOURNAL_FSYNC_BATCH = 64      # この件数ごとに fsync
+JOURNAL_FSYNC_INTERVAL = 0.2  # 最後の fsync からこの秒数が経てば fsync
+
+# ゲームサーバー
+SERVER_URL = "http://localhost:5000"
+HTTP_CONNECT_TIMEOUT = 2.0  # サーバーへの HTTP 接続タイムアウト (秒)
+HTTP_READ_TIMEOUT = 5.0     # サーバーの応答待ちタイムアウト (秒)
+HTTP_RETRIES = 2            # 接続失敗・503 などでの再試行回数
+HTTP_MAX_WORKERS = 2        # HTTP リクエストを処理するスレッド数
+REALTIME_COALESCE_MS = 16      # Socket.IO のイベントを GUI にまとめて渡す間隔 (ms)
+REALTIME_PING_INTERVAL = 5.0   # サーバーとの往復遅延を測る間隔 (秒)
+
+# 押下の転送 (BLE プロセス -> ゲームサーバー)
+FORWARD_BATCH_INTERVAL = 0.002  # 最初の押下からこの秒数だけ待ってまとめて送る
+FORWARD_MAX_BATCH = 64          # 1回に送る最大件数
+FORWARD_BUFFER_SIZE = 10000     # 切断中に溜めておく最大件数 (超えたら古いものから捨てる)
+FORWARD_ACK_TIMEOUT = 2.0       # サーバーの受領応答を待つ秒数
+FORWARD_HOLD_WINDOW = 1.0       # 受付外の押下を、開始通知の遅れに備えて取っておく秒数
+GATEWAY_AUTO_RESET = 10.0       # gateway.py --local で1位が出てから次のラウンドを始めるまでの秒数 (0 で自動リセットしない)
+
+# 切断時の自動再接続
+RECONNECT_BASE_DELAY = 0.5  # 最初の再接続までの待ち時間 (秒)
+RECONNECT_MAX_DELAY = 10.0  # 再接続間隔の上限 (秒)
+
+# 複数の Bluetooth アダプタへの振り分け
+# HAYAOSHI_BLE_ADAPTERS="hci0,hci1" のように指定する。空なら OS の既定アダプタだけを使う。
+BLE_ADAPTERS = [a.strip() for a in os.environ.get("HAYAOSHI_BLE_ADAPTERS", "").split(",") if a.strip()]
+MAX_CONNECTIONS_PER_ADAPTER = int(os.environ.get("HAYAOSHI_MAX_CONNECTIONS_PER_ADAPTER", "8"))  # 1アダプタあたりの上限
+
+# アドバタイズ押下モード (接続せずに広告パケットで押下を受け取る)
+# メーカー固有データ: [バージョン (u8)] [ボタンID (u8)] [押下番号 seq (u16 LE)] [押してからの経過 ms (u16 LE)]
+# ボタンは押すたびに seq を1つ進め、同じ内容 (経過時間だけ更新) をしばらく広告し続ける
+ADV_COMPANY_ID = 0xFFFF  # 試験・開発用の会社ID
+ADV_PRESS_VERSION = 1
+ADV_PRESS_FORMAT = "<BBHH"
+ADV_DEDUPE_WINDOW = 30.0  # 同じ seq でもこの秒数以上空いたら別の押下とみなす (ボタンの再起動対策)
+ADV_MAX_PRESS_AGE = 2.0   # これより前に押された押下は受け付けない (受信開始前から広告されていた押下など)
+
+# GUI の表示更新
+LOG_MAX_LINES = 5000       # ログ表示に残す最大行数 (古い行から捨てる)
+GUI_FLUSH_INTERVAL_MS = 100  # ログ・通知レート表示をまとめて反映する間隔 (ms)
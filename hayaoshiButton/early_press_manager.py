@@ -1,12 +1,9 @@
-import socketio
-import threading
-import requests
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QLabel, QPushButton, QListWidget
-from PySide6.QtCore import Signal, QMetaObject, Qt
 
-class EarlyPressManager(QWidget):
-    order_updated = Signal(list)  # 順位リスト更新通知用シグナル
+from http_client import shared_http_client
+from realtime_client import shared_realtime_client
 
+class EarlyPressManager(QWidget):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("早押しゲーム管理")
@@ -26,39 +23,45 @@ class EarlyPressManager(QWidget):
         self.start_button.clicked.connect(self.start_game)
         self.stop_button.clicked.connect(self.stop_game)
 
-        self.order_updated.connect(self.update_order_display)
-
-        # Socket.IOクライアント初期化（別スレッドで起動）
-        self.sio = socketio.Client()
+        self.order_items = []
+        self.http = shared_http_client()
 
-        self.sio.on('early_press_order_updated', self.on_order_updated)
-        self.sio.on('early_press_winner', self.on_winner)
-        self.sio.on('connect', lambda: print('Socket.IO connected'))
-        self.sio.on('disconnect', lambda: print('Socket.IO disconnected'))
-
-        self.thread = threading.Thread(target=self.start_socketio)
-        self.thread.daemon = True
-        self.thread.start()
+        # サーバーの更新は他のウィンドウと共有の接続から受け取る
+        self.realtime = shared_realtime_client()
+        self.realtime.order_snapshot.connect(self.update_order_display)
+        self.realtime.order_deltas.connect(self.apply_order_deltas)
+        self.realtime.game_reset.connect(self.reset_order)
+        self.realtime.winner.connect(self.on_winner)
+        self.realtime.connection_changed.connect(
+            lambda connected: print('Socket.IO connected' if connected else 'Socket.IO disconnected')
+        )
+        self.realtime.resync_failed.connect(self.print_error("順位取得"))
 
         # 起動時に現在の順位をAPIから取得
         self.fetch_current_order()
 
-    def start_socketio(self):
-        try:
-            self.sio.connect('http://localhost:5000')
-            self.sio.wait()
-        except Exception as e:
-            print(f"Socket.IO接続エラー: {e}")
-
-    def on_order_updated(self, order):
-        # GUIスレッドで安全に処理するためシグナル発行
-        QMetaObject.invokeMethod(self, "order_updated", Qt.QueuedConnection, args=[order])
+    @staticmethod
+    def format_order_item(item):
+        return f"{item['order']}位: {item['name']} (ボタンID: {item['button_id']})"
 
     def update_order_display(self, order):
         self.order_list.clear()
-        for item in order:
-            text = f"{item['order']}位: {item['name']} (ボタンID: {item['button_id']})"
-            self.order_list.addItem(text)
+        self.order_items = [dict(item) for item in order]
+        for item in self.order_items:
+            self.order_list.addItem(self.format_order_item(item))
+
+    # 差分は RealtimeClient が順番を確認した上でまとめて届ける
+    def apply_order_deltas(self, deltas):
+        for delta in deltas:
+            row = delta["order"] - 1
+            self.order_items.insert(row, dict(delta))
+            self.order_list.insertItem(row, self.format_order_item(delta))
+            for i in range(row + 1, len(self.order_items)):
+                self.order_items[i]["order"] = i + 1
+                self.order_list.item(i).setText(self.format_order_item(self.order_items[i]))
+
+    def reset_order(self, data):
+        self.update_order_display([])
 
     def on_winner(self, winner):
         name = winner.get("name", "不明")
@@ -66,35 +69,27 @@ class EarlyPressManager(QWidget):
         button_id = winner.get("button_id", "不明")
         print(f"勝者決定！ {name} ({address}) ボタンID: {button_id}")
 
+    @staticmethod
+    def print_result(label):
+        def on_finished(status, data):
+            if 200 <= status < 300:
+                print(f"{label}リクエスト成功")
+            else:
+                print(f"{label}リクエスト失敗: {status}")
+        return on_finished
+
+    @staticmethod
+    def print_error(label):
+        return lambda error: print(f"{label}リクエスト例外: {error}")
+
     def start_game(self):
         self.status_label.setText("ゲーム状態: 開始中")
-        try:
-            resp = requests.post('http://localhost:5000/early_press/start')
-            if resp.ok:
-                print("ゲーム開始リクエスト成功")
-            else:
-                print(f"ゲーム開始リクエスト失敗: {resp.status_code}")
-        except Exception as e:
-            print(f"ゲーム開始リクエスト例外: {e}")
+        self.http.post('/early_press/start', self.print_result("ゲーム開始"), self.print_error("ゲーム開始"))
 
     def stop_game(self):
         self.status_label.setText("ゲーム状態: 停止中")
-        try:
-            resp = requests.post('http://localhost:5000/early_press/stop')
-            if resp.ok:
-                print("ゲーム停止リクエスト成功")
-            else:
-                print(f"ゲーム停止リクエスト失敗: {resp.status_code}")
-        except Exception as e:
-            print(f"ゲーム停止リクエスト例外: {e}")
+        self.http.post('/early_press/stop', self.print_result("ゲーム停止"), self.print_error("ゲーム停止"))
 
+    # 結果は RealtimeClient の order_snapshot で届く
     def fetch_current_order(self):
-        try:
-            resp = requests.get('http://localhost:5000/early_press/current_order')
-            if resp.ok:
-                order = resp.json().get('order', [])
-                self.update_order_display(order)
-            else:
-                print(f"順位取得失敗: {resp.status_code}")
-        except Exception as e:
-            print(f"順位取得例外: {e}")
+        self.realtime.resync()
@@ -0,0 +1,290 @@
+# event_journal.py
+
+import argparse
+import mmap
+import os
+import struct
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from constants import JOURNAL_FSYNC_BATCH, JOURNAL_FSYNC_INTERVAL
+from press_ledger import PressLedger
+
+# --- レコード形式 (固定長 56 byte, リトルエンディアン) ---
+# type(u8) flags(u8) button_id(u16) address(16s)
+# timestamp(f64: 順位付けに使う時刻) host_time(f64: ホスト受信時刻) device_time(i64: µs)
+# a(i32) b(i32) padding(4)
+RECORD = struct.Struct("<BBH16sddqii4x")
+
+EVENT_GAME_START = 1
+EVENT_GAME_STOP = 2
+EVENT_PRESS = 3
+EVENT_JUDGEMENT = 4  # a: 1=正解 0=不正解, b: プレイヤーID
+EVENT_SCORE = 5      # a: プレイヤーID, b: 加算ポイント
+EVENT_SCORE_RESET = 6  # a: 0 に戻したプレイヤーID (SCORE_RESET_ALL なら全員を削除した)
+
+SCORE_RESET_ALL = -1
+
+FLAG_ADDR_MAC = 0x01
+FLAG_ADDR_UUID = 0x02
+FLAG_ADDR_TEXT = 0x04
+FLAG_HAS_DEVICE_TIME = 0x08
+
+
+class JournalEvent(NamedTuple):
+    type: int
+    address: str
+    button_id: int
+    timestamp: float
+    host_time: float
+    device_time: Optional[int]
+    a: int
+    b: int
+
+
+# アドレスを16byteに詰める。MAC は6byte、macOS の UUID 形式は16byte、それ以外は UTF-8 で切り詰める。
+def _encode_address(address: str):
+    if not address:
+        return 0, b""
+    parts = address.split(":")
+    if len(parts) == 6 and all(len(p) == 2 for p in parts):
+        try:
+            return FLAG_ADDR_MAC, bytes.fromhex("".join(parts))
+        except ValueError:
+            pass
+    try:
+        return FLAG_ADDR_UUID, uuid.UUID(address).bytes
+    except ValueError:
+        return FLAG_ADDR_TEXT, address.encode("utf-8")[:16]
+
+
+def _decode_address(flags: int, raw: bytes) -> str:
+    if flags & FLAG_ADDR_MAC:
+        return ":".join(f"{b:02X}" for b in raw[:6])
+    if flags & FLAG_ADDR_UUID:
+        return str(uuid.UUID(bytes=raw)).upper()
+    if flags & FLAG_ADDR_TEXT:
+        return raw.rstrip(b"\0").decode("utf-8", errors="replace")
+    return ""
+
+
+# 追記専用のイベントジャーナル。
+# write は毎回 OS に渡し、fsync は JOURNAL_FSYNC_BATCH 件ごとか
+# JOURNAL_FSYNC_INTERVAL 秒ごとにまとめて行う。
+class EventJournal:
+    def __init__(
+        self,
+        path: str,
+        fsync_batch: int = JOURNAL_FSYNC_BATCH,
+        fsync_interval: float = JOURNAL_FSYNC_INTERVAL,
+    ):
+        self.path = path
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._fsync_batch = max(1, fsync_batch)
+        self._fsync_interval = fsync_interval
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._syncer = threading.Thread(target=self._sync_loop, name="EventJournalSync", daemon=True)
+        self._syncer.start()
+
+    def append(
+        self,
+        event_type: int,
+        address: str = "",
+        button_id: int = 0,
+        timestamp: Optional[float] = None,
+        host_time: Optional[float] = None,
+        device_time: Optional[int] = None,
+        a: int = 0,
+        b: int = 0,
+    ):
+        flags, raw_address = _encode_address(address or "")
+        if device_time is not None:
+            flags |= FLAG_HAS_DEVICE_TIME
+        now = time.time()
+        record = RECORD.pack(
+            event_type,
+            flags,
+            int(button_id or 0) & 0xFFFF,
+            raw_address,
+            now if timestamp is None else timestamp,
+            now if host_time is None else host_time,
+            device_time if device_time is not None else 0,
+            a,
+            b,
+        )
+        with self._lock:
+            if self._closed.is_set():
+                return
+            os.write(self._fd, record)
+            self._unsynced += 1
+            if self._unsynced >= self._fsync_batch:
+                self._sync_locked()
+
+    def game_start(self, timestamp: Optional[float] = None):
+        self.append(EVENT_GAME_START, timestamp=timestamp, host_time=timestamp)
+
+    def game_stop(self):
+        self.append(EVENT_GAME_STOP)
+
+    def press(self, address: str, button_id: int, timestamp: float,
+              host_time: Optional[float] = None, device_time: Optional[int] = None):
+        self.append(EVENT_PRESS, address, button_id, timestamp, host_time, device_time)
+
+    def judgement(self, address: str, correct: bool, player_id: int):
+        self.append(EVENT_JUDGEMENT, address, a=1 if correct else 0, b=player_id)
+
+    def score(self, player_id: int, delta: int):
+        self.append(EVENT_SCORE, a=player_id, b=delta)
+
+    # 得点を 0 に戻した (名前の再登録) / 全員を削除した (初期化) ことを残し、再生した累計を DB とそろえる
+    def score_reset(self, player_id: int = SCORE_RESET_ALL):
+        self.append(EVENT_SCORE_RESET, a=player_id)
+
+    def _sync_locked(self):
+        if self._unsynced:
+            os.fsync(self._fd)
+            self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _sync_loop(self):
+        while not self._closed.wait(self._fsync_interval):
+            with self._lock:
+                if not self._closed.is_set() and time.monotonic() - self._last_sync >= self._fsync_interval:
+                    self._sync_locked()
+
+    def flush(self):
+        with self._lock:
+            if not self._closed.is_set():
+                self._sync_locked()
+
+    def close(self):
+        with self._lock:
+            if self._closed.is_set():
+                return
+            self._sync_locked()
+            self._closed.set()
+            os.close(self._fd)
+
+
+# ファイル全体を mmap して固定長レコードをまとめて読む。
+# 書き込み途中で落ちた末尾の半端なレコードは無視する。
+def read_events(path: str) -> List[JournalEvent]:
+    if not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        usable = size - size % RECORD.size
+        if usable == 0:
+            return []
+        events = []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+                memoryview(mm) as whole, whole[:usable] as view:
+            for (event_type, flags, button_id, raw_address, timestamp, host_time,
+                 device_time, a, b) in RECORD.iter_unpack(view):
+                events.append(JournalEvent(
+                    event_type,
+                    _decode_address(flags, raw_address),
+                    button_id,
+                    timestamp,
+                    host_time,
+                    device_time if flags & FLAG_HAS_DEVICE_TIME else None,
+                    a,
+                    b,
+                ))
+        return events
+
+
+# ジャーナルを先頭から再生して、最後のラウンドの状態とラウンドごとの記録を作り直す
+def replay(events: List[JournalEvent]) -> Dict[str, Any]:
+    ledger = PressLedger()
+    active = False
+    rounds: List[Dict[str, Any]] = []
+    scores: Dict[int, int] = {}
+    judged = set()
+
+    for event in events:
+        if event.type == EVENT_GAME_START:
+            active = True
+            ledger.reset()
+            judged = set()
+            rounds.append({"started_at": event.host_time, "presses": [], "accepted": [], "judgements": []})
+        elif event.type == EVENT_GAME_STOP:
+            active = False
+        elif event.type == EVENT_PRESS:
+            if rounds:
+                rounds[-1]["presses"].append(event)
+            # ラウンド開始より前の押下 (前のラウンドの送り直し) は受け付けない
+            if active and event.timestamp >= rounds[-1]["started_at"]:
+                rounds[-1]["accepted"].append(event)
+                ledger.add(
+                    event.address, event.button_id, event.timestamp,
+                    host_time=event.host_time, device_time=event.device_time,
+                )
+        elif event.type == EVENT_JUDGEMENT:
+            judged.add(event.address)
+            if rounds:
+                rounds[-1]["judgements"].append(event)
+        elif event.type == EVENT_SCORE:
+            scores[event.a] = scores.get(event.a, 0) + event.b
+        elif event.type == EVENT_SCORE_RESET:
+            if event.a == SCORE_RESET_ALL:
+                scores.clear()
+            else:
+                scores.pop(event.a, None)
+
+    return {"active": active, "ledger": ledger, "judged": judged, "rounds": rounds, "scores": scores}
+
+
+def _format_time(value: float) -> str:
+    return f"{value:.6f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="早押しイベントジャーナルの再生・監査")
+    parser.add_argument("path", help="ジャーナルファイル")
+    parser.add_argument("--round", type=int, default=None, help="表示するラウンド番号 (1始まり)。省略時は全ラウンドの概要")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    events = read_events(args.path)
+    state = replay(events)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    print(f"{len(events)} 件のイベントを {elapsed_ms:.2f} ms で再生しました。"
+          f" ラウンド数: {len(state['rounds'])}, 受付中: {state['active']}")
+
+    if args.round is None:
+        for i, rnd in enumerate(state["rounds"], start=1):
+            print(f"  ラウンド {i}: 押下 {len(rnd['presses'])} 件, 判定 {len(rnd['judgements'])} 件")
+        for player_id, total in sorted(state["scores"].items()):
+            print(f"  プレイヤーID {player_id}: 累計 {total:+d} 点")
+        return
+
+    if not state["rounds"] and any(event.type == EVENT_PRESS for event in events):
+        parser.error("ラウンドの開始が記録されていないジャーナルです (古いゲートウェイの記録など)。"
+                     "ラウンドごとの順位は出せません。")
+    if not 1 <= args.round <= len(state["rounds"]):
+        parser.error(f"ラウンド {args.round} はありません。")
+    rnd = state["rounds"][args.round - 1]
+    # 再生と同じく、受付中かつ開始以降の押下だけで順位を付ける
+    ledger = PressLedger()
+    for event in rnd["accepted"]:
+        ledger.add(event.address, event.button_id, event.timestamp,
+                   host_time=event.host_time, device_time=event.device_time)
+    print(f"ラウンド {args.round} (開始 {_format_time(rnd['started_at'])},"
+          f" 押下 {len(rnd['presses'])} 件のうち受付 {len(rnd['accepted'])} 件)")
+    for entry in ledger.snapshot():
+        device_time = entry["device_time"] if entry["device_time"] is not None else "-"
+        print(f"  {entry['order']}位 {entry['address']} ボタンID {entry['button_id']}"
+              f" 判定時刻 {_format_time(entry['timestamp'])} 受信 {_format_time(entry['host_time'])}"
+              f" デバイス {device_time}")
+    for event in rnd["judgements"]:
+        print(f"  判定: {event.address} {'正解' if event.a else '不正解'} (プレイヤーID {event.b})")
+
+
+if __name__ == "__main__":
+    main()
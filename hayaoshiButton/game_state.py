@@ -0,0 +1,181 @@
+# game_state.py
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from press_ledger import PressLedger
+
+PRESS_EXTRA_KEYS = ("name", "host_time", "device_time")  # 押下イベントで台帳に一緒に残す項目
+
+
+# 早押しゲームの状態 (受付中フラグと押下台帳) を持つアクター。
+# HTTP ハンドラや Socket.IO ハンドラはコマンドをキューに積むだけで、
+# 状態を書き換えるのは1本のバックグラウンドタスクだけ (単一ライター)。
+# eventlet で monkey patch されていれば queue もグリーンスレッド対応になる。
+class GameStateActor:
+    def __init__(self, socketio, journal=None):
+        self._socketio = socketio
+        self._journal = journal  # EventJournal (省略可)
+        self._commands: "queue.Queue" = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self.active = False
+        self.started_at: Optional[float] = None  # ラウンド開始時刻 (time.time())
+        self.ledger = PressLedger()
+        self.button_players: Dict[str, str] = {}  # アドレスまたはデバイス名 -> プレイヤー名
+        self._judged = set()  # このラウンドで判定済みのアドレス
+
+    # ジャーナルの再生結果 (event_journal.replay) から状態を復元する。ワーカー起動前に呼ぶ。
+    def restore(self, state: Dict[str, Any]):
+        self.active = state["active"]
+        self.started_at = state["rounds"][-1]["started_at"] if state["rounds"] else None
+        self.ledger = state["ledger"]
+        self._judged = set(state["judged"])
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = self._socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            fn, args, reply = self._commands.get()
+            try:
+                result, error = fn(*args), None
+            except Exception as e:
+                result, error = None, e
+            if reply is not None:
+                reply.put((result, error))
+            elif error is not None:
+                print(f"ゲーム状態の更新に失敗しました: {error}")
+
+    # 結果を待つコマンド
+    def call(self, fn: Callable[..., Any], *args: Any, timeout: float = 5.0) -> Any:
+        self._ensure_worker()
+        reply: "queue.Queue" = queue.Queue(maxsize=1)
+        self._commands.put((fn, args, reply))
+        result, error = reply.get(timeout=timeout)
+        if error is not None:
+            raise error
+        return result
+
+    # 結果を待たないコマンド
+    def cast(self, fn: Callable[..., Any], *args: Any):
+        self._ensure_worker()
+        self._commands.put((fn, args, None))
+
+    # --- 公開 API ---
+    def start_game(self):
+        return self.call(self._start_game)
+
+    def stop_game(self):
+        return self.call(self._stop_game)
+
+    def current_order(self) -> Dict[str, Any]:
+        return self.call(self._current_order)
+
+    # 受付中かどうかとラウンド開始時刻 (転送役が押下をラウンドごとに絞り込むのに使う)
+    def round_state(self) -> Dict[str, Any]:
+        return self.call(self._round_state)
+
+    def press(self, address: str, button_id: Any, timestamp: float, **extra: Any):
+        self.cast(self._press, address, button_id, timestamp, extra)
+
+    # 転送役からまとめて届いた押下を1コマンドで処理する
+    def press_batch(self, presses: List[Dict[str, Any]]):
+        self.cast(self._press_batch, presses)
+
+    def assign_buttons(self, mapping: Dict[str, str]):
+        return self.call(self.button_players.update, dict(mapping))
+
+    # まだ判定していない最上位の回答者 (判定はしない)
+    def peek_responder(self) -> Optional[Dict[str, Any]]:
+        return self.call(self._next_responder)
+
+    # まだ判定していない最上位の回答者を取り出し、判定済みにする
+    def take_responder(self) -> Optional[Dict[str, Any]]:
+        return self.call(self._take_responder)
+
+    # 得点の反映に失敗したときに判定済みを取り消す
+    def release_responder(self, address: str):
+        self.cast(self._judged.discard, address)
+
+    # --- ここから下はワーカー上でのみ実行される ---
+    def _start_game(self):
+        self.active = True
+        self.started_at = time.time()
+        self.ledger.reset()
+        self._judged.clear()
+        if self._journal is not None:
+            self._journal.game_start(self.started_at)
+        self._socketio.emit('early_press_game_reset', {"seq": self.ledger.seq, "started_at": self.started_at})
+
+    def _stop_game(self):
+        self.active = False
+        if self._journal is not None:
+            self._journal.game_stop()
+        self._socketio.emit('early_press_game_stopped')
+
+    def _round_state(self) -> Dict[str, Any]:
+        return {"active": self.active, "started_at": self.started_at}
+
+    def _current_order(self) -> Dict[str, Any]:
+        # seq は差分イベント (early_press_order_delta) の通し番号と揃えてある
+        return {"order": self.ledger.snapshot(), "seq": self.ledger.seq}
+
+    def _player_for(self, entry: Dict[str, Any]) -> str:
+        return (
+            self.button_players.get(entry["address"])
+            or self.button_players.get(entry.get("name"))
+            or entry.get("name")
+        )
+
+    def _next_responder(self) -> Optional[Dict[str, Any]]:
+        for entry in self.ledger.snapshot():
+            if entry["address"] not in self._judged:
+                entry["player"] = self._player_for(entry)
+                return entry
+        return None
+
+    def _take_responder(self) -> Optional[Dict[str, Any]]:
+        entry = self._next_responder()
+        if entry is not None:
+            self._judged.add(entry["address"])
+        return entry
+
+    def _press(self, address: str, button_id: Any, timestamp: float, extra: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if self._journal is not None:
+            self._journal.press(address, button_id, timestamp, extra.get("host_time"), extra.get("device_time"))
+        if not self.active:
+            return None
+        # 切断中に溜まっていた前のラウンドの押下が遅れて届いても順位に入れない
+        if self.started_at is not None and timestamp < self.started_at:
+            return None
+        delta = self.ledger.add(address, button_id, timestamp, **extra)
+        if delta is None:
+            return None
+
+        # 全順位ではなく追加分だけを送る。seq が飛んだクライアントは current_order を取り直す
+        self._socketio.emit('early_press_order_delta', delta)
+        # 押下時刻がより早い押下が後から届くと1位が入れ替わるので、そのたびに勝者を送り直す
+        if delta["order"] == 1:
+            self._socketio.emit('early_press_winner', self.ledger.winner)
+        return delta
+
+    # 受領応答は返し済みなので、不正な1件があっても残りの押下は処理する
+    def _press_batch(self, presses: List[Dict[str, Any]]):
+        for press in presses:
+            address = press.get("address")
+            timestamp = press.get("timestamp", time.time())
+            if not isinstance(address, str) or not isinstance(timestamp, (int, float)) or isinstance(timestamp, bool):
+                print(f"不正な押下を無視しました: {press}")
+                continue
+            extra = {key: press[key] for key in PRESS_EXTRA_KEYS if press.get(key) is not None}
+            try:
+                self._press(address, press.get("button_id"), timestamp, extra)
+            except Exception as e:
+                print(f"押下の処理に失敗しました ({address}): {e}")
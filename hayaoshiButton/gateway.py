@@ -0,0 +1,165 @@
+# gateway.py
+#
+# GUI を使わずに BLE 側だけを動かすゲートウェイ。Qt を読み込まないので、
+# 小さな Linux 機に常駐させて押下をゲームサーバーへ流す用途に使う。
+#
+#   python gateway.py --names BTN1 BTN2 BTN3        # 接続して押下をサーバーへ転送
+#   python gateway.py --adv                         # 接続せず広告で押下を受け取る
+#   python gateway.py --names BTN1 --local          # サーバーを使わずローカルで判定
+#
+# --local では標準入力の1行コマンドでラウンドを操作する (Enter / r: 新しいラウンド, s: 受付終了, q: 終了)。
+# 1位が出てから --auto-reset 秒たつと自動で次のラウンドを始める。
+
+import argparse
+import signal
+import sys
+import threading
+from typing import Any, Optional
+
+from ble_core import BleCore
+from constants import SERVER_URL, MAX_ALLOWED_DEVICES, GATEWAY_AUTO_RESET
+
+# 標準出力に出すイベント (通知の中身やレートのように頻繁なものは出さない)
+LOGGED_EVENTS = {
+    "connected": lambda address, name: f"接続: {name} ({address})",
+    "disconnected": lambda address: f"切断: {address}",
+    "link_lost": lambda address, name: f"接続が切れました。再接続します: {name} ({address})",
+    "error_occurred": lambda message: f"エラー: {message}",
+    "adv_mode_changed": lambda enabled: "アドバタイズ受信を開始しました。" if enabled else "アドバタイズ受信を停止しました。",
+    "early_press_winner": lambda winner: f"勝者決定！ {winner.get('name')} ({winner.get('address')}) ボタンID: {winner.get('button_id')}",
+}
+
+
+def log_sink(event: str, *args: Any):
+    format_event = LOGGED_EVENTS.get(event)
+    if format_event is not None:
+        print(format_event(*args), flush=True)
+
+
+def _on_connect_all_finished(results):
+    ok = sum(1 for message in results.values() if message is None)
+    print(f"一括接続完了: {ok}/{len(results)} 台", flush=True)
+
+
+# --local のラウンド操作。標準入力のコマンドと、1位が出てからの自動リセットの両方から呼ばれる
+class LocalRounds:
+    def __init__(self, core: BleCore, auto_reset: float):
+        self._core = core
+        self._auto_reset = auto_reset
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        self.round = 0
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def start(self):
+        with self._lock:
+            self._cancel_timer()
+            self.round += 1
+            self._core.start_local_game()
+        print(f"ラウンド {self.round} を開始しました。", flush=True)
+
+    def stop(self):
+        with self._lock:
+            self._cancel_timer()
+            self._core.stop_local_game()
+        print("受付を終了しました。", flush=True)
+
+    def close(self):
+        with self._lock:
+            self._cancel_timer()
+
+    # 1位が入れ替わって勝者が送り直されても、タイマーはラウンドごとに1回だけ仕掛ける
+    def on_winner(self, _winner: Any):
+        if self._auto_reset <= 0:
+            return
+        with self._lock:
+            if self._timer is None:
+                self._timer = threading.Timer(self._auto_reset, self.start)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def read_commands(self, stop: threading.Event):
+        for line in sys.stdin:
+            command = line.strip().lower()
+            if command in ("", "r", "reset"):
+                self.start()
+            elif command in ("s", "stop"):
+                self.stop()
+            elif command in ("q", "quit"):
+                stop.set()
+                return
+            else:
+                print("コマンド: Enter / r = 新しいラウンド, s = 受付終了, q = 終了", flush=True)
+        # 標準入力が閉じられただけなら (デーモンとして動かしている場合など) 終了せず、自動リセットに任せる
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Qt を使わずに BLE ボタンの押下を受け取るゲートウェイ")
+    parser.add_argument("--names", nargs="*", default=[], help="接続対象のデバイス名")
+    parser.add_argument("--adv", action="store_true", help="接続せずにアドバタイズで押下を受け取る")
+    parser.add_argument("--server", default=SERVER_URL, help="押下を送るゲームサーバー")
+    parser.add_argument("--local", action="store_true", help="サーバーへ送らずローカルの台帳で判定する")
+    parser.add_argument("--journal", default=None, help="ラウンドの区切りと押下を記録するジャーナルファイル")
+    parser.add_argument("--max-devices", type=int, default=MAX_ALLOWED_DEVICES, help="最大接続台数")
+    parser.add_argument("--auto-reset", type=float, default=GATEWAY_AUTO_RESET,
+                        help="--local で1位が出てから次のラウンドを始めるまでの秒数 (0 で自動リセットしない)")
+    args = parser.parse_args()
+    if not args.names and not args.adv:
+        parser.error("--names か --adv のどちらかを指定してください。")
+
+    core = BleCore(max_devices=args.max_devices)
+    try:
+        core.set_target_device_names(args.names)
+    except ValueError as e:
+        parser.error(str(e))
+    core.add_sink(log_sink)
+    core.on("connect_all_finished", _on_connect_all_finished)
+
+    journal = None
+    if args.journal:
+        from event_journal import EventJournal
+        journal = EventJournal(args.journal)
+
+    forwarder = None
+    rounds = None
+    if args.local:
+        core.set_journal(journal)
+        rounds = LocalRounds(core, args.auto_reset)
+        core.on("early_press_winner", rounds.on_winner)
+        rounds.start()
+    else:
+        from press_forwarder import PressForwarder
+        # ラウンドの区切りはサーバーの通知で分かるので、ジャーナルは転送役に記録させる
+        forwarder = PressForwarder(args.server, journal=journal)
+        forwarder.start()
+        core.set_forwarder(forwarder)
+
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    if args.adv:
+        core.start_adv_mode()
+    else:
+        core.connect_all_targets()
+    if rounds is not None:
+        threading.Thread(target=rounds.read_commands, args=(stop,), name="LocalRounds", daemon=True).start()
+
+    try:
+        stop.wait()
+    finally:
+        if rounds is not None:
+            rounds.close()
+        core.cleanup()
+        if forwarder is not None:
+            forwarder.stop()
+        if journal is not None:
+            journal.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# gatt_cache.py
+
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from constants import (
+    GATT_CACHE_PATH,
+    ESP32_SERVICE_UUID,
+    ESP32_CHAR_UUID_NOTIFY,
+    ESP32_CHAR_UUID_RAISE_FLAG,
+)
+
+
+# アドレスごとに ESP32 のキャラクタリスティックハンドルを覚えておくキャッシュ。
+# 一度解決したハンドルはファイルに保存され、再接続時はサービス探索なしで使える。
+class GattCache:
+    def __init__(self, path: Optional[str] = GATT_CACHE_PATH):
+        self._path = path
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def _key(address: str) -> str:
+        return address.upper()
+
+    def get(self, address: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(self._key(address))
+            return dict(entry) if entry else None
+
+    def address_for_name(self, name: str) -> Optional[str]:
+        with self._lock:
+            for address, entry in self._entries.items():
+                if entry.get("name") == name:
+                    return address
+        return None
+
+    # 接続済みクライアントのサービス一覧からハンドルを解決して保存する
+    def resolve(self, address: str, name: str, services) -> Dict[str, Any]:
+        service = services.get_service(ESP32_SERVICE_UUID)
+        if service is None:
+            raise Exception(f"{address} でターゲットサービスが見つかりませんでした。")
+        notify_char = service.get_characteristic(ESP32_CHAR_UUID_NOTIFY)
+        if notify_char is None or "notify" not in notify_char.properties:
+            raise Exception(f"{address} で通知対応キャラクタリスティックが見つかりませんでした。")
+        raise_flag_char = service.get_characteristic(ESP32_CHAR_UUID_RAISE_FLAG)
+
+        entry = {
+            "name": name,
+            "notify": notify_char.handle,
+            "raise_flag": raise_flag_char.handle if raise_flag_char is not None else None,
+        }
+        with self._lock:
+            self._entries[self._key(address)] = entry
+        self._save()
+        return dict(entry)
+
+    def invalidate(self, address: str):
+        with self._lock:
+            removed = self._entries.pop(self._key(address), None)
+        if removed is not None:
+            self._save()
+
+    def _load(self):
+        if not self._path or not os.path.exists(self._path):
+            return
+        try:
+            with open(self._path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                self._entries = {self._key(k): v for k, v in data.items() if isinstance(v, dict)}
+        except (OSError, ValueError) as e:
+            print(f"GATTキャッシュの読み込みに失敗しました: {e}")
+
+    def _save(self):
+        if not self._path:
+            return
+        with self._lock:
+            data = dict(self._entries)
+        tmp_path = f"{self._path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self._path)
+        except OSError as e:
+            print(f"GATTキャッシュの保存に失敗しました: {e}")
@@ -1,20 +1,22 @@
 import sys
 import re
-import threading
-import requests
-import socketio
 from PySide6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
-    QTextEdit, QListWidget, QListWidgetItem, QLineEdit, QLabel,
-    QGroupBox, QFormLayout
+    QListWidget, QListWidgetItem, QLineEdit, QLabel,
+    QGroupBox, QFormLayout, QGridLayout, QListView, QTableView, QHeaderView, QAbstractItemView
 )
-from PySide6.QtCore import QCoreApplication, QThread, Slot, Qt, QMetaObject
-from PySide6.QtGui import QColor
+from PySide6.QtCore import QCoreApplication, QThread, QTimer, Slot, Qt, QSortFilterProxyModel
 from typing import List, Dict, Any
 
 from ble_worker import BleWorker
+from http_client import shared_http_client
+from log_model import LogListModel, RateTableModel, SORT_ROLE
+from press_forwarder import PressForwarder
+from realtime_client import shared_realtime_client
 from constants import ESP32_SERVICE_UUID, ESP32_CHAR_UUID_NOTIFY, MAX_ALLOWED_DEVICES
 
+TARGET_NAME_COLUMNS = 4  # 接続対象デバイス名の入力欄を1行に並べる数
+
 
 class BleApp(QWidget):
     def __init__(self):
@@ -41,17 +43,20 @@ class BleApp(QWidget):
             "スキャン結果をこの名前でフィルタリングします。空の場合は接続対象の名前でフィルタリングを試みます。"
         )
 
+        # 台数が多くても横に伸びすぎないよう、入力欄は TARGET_NAME_COLUMNS 列ずつ折り返して並べる
         self.target_name_inputs = []
-        target_names_h_layout = QHBoxLayout()
+        target_names_grid = QGridLayout()
         for i in range(MAX_ALLOWED_DEVICES):
             input_box = QLineEdit()
             input_box.setPlaceholderText(f"デバイス名 {i + 1}")
             self.target_name_inputs.append(input_box)
-            target_names_h_layout.addWidget(input_box)
+            target_names_grid.addWidget(input_box, i // TARGET_NAME_COLUMNS, i % TARGET_NAME_COLUMNS)
 
         self.set_target_names_button = QPushButton("接続したいデバイス名を設定")
         self.set_target_names_button.clicked.connect(self._set_target_device_names)
-        target_names_h_layout.addWidget(self.set_target_names_button)
+        target_names_h_layout = QHBoxLayout()
+        target_names_h_layout.addLayout(target_names_grid)
+        target_names_h_layout.addWidget(self.set_target_names_button, alignment=Qt.AlignTop)
         self.settings_layout.addRow(f"接続対象デバイス名 (最大{MAX_ALLOWED_DEVICES}つ):", target_names_h_layout)
         self.settings_layout.labelForField(target_names_h_layout).setToolTip(
             f"接続できるのは、ここで設定された名前を持つデバイスのみで、合計{MAX_ALLOWED_DEVICES}台までです。"
@@ -66,11 +71,20 @@ class BleApp(QWidget):
         self.scan_button = QPushButton("BLEデバイスをスキャン")
         self.scan_button.clicked.connect(self._start_ble_scan)
         self.scan_layout.addWidget(self.scan_button)
+        self.connect_all_button = QPushButton("接続対象デバイスに一括接続")
+        self.connect_all_button.clicked.connect(self._connect_all_targets)
+        self.scan_layout.addWidget(self.connect_all_button)
+        # 接続せずに広告パケットで押下を受け取るモード (台数が多い会場向け)
+        self.adv_mode_button = QPushButton("アドバタイズ押下モード")
+        self.adv_mode_button.setCheckable(True)
+        self.adv_mode_button.toggled.connect(self._toggle_adv_mode)
+        self.scan_layout.addWidget(self.adv_mode_button)
         self.device_list_widget = QListWidget()
         self.device_list_widget.itemDoubleClicked.connect(self._connect_selected_device)
         self.scan_layout.addWidget(self.device_list_widget)
         self.control_layout.addWidget(self.scan_group)
         self.scanned_devices_map = {}
+        self._scanned_items: Dict[str, QListWidgetItem] = {}
 
         self.connected_group = QGroupBox("接続中のターゲットデバイス")
         self.connected_layout = QVBoxLayout(self.connected_group)
@@ -84,16 +98,33 @@ class BleApp(QWidget):
         # --- 通知速度表示 ---
         self.notification_rate_group = QGroupBox("通知速度 (Hz / ms 遅延)")
         self.notification_rate_layout = QVBoxLayout(self.notification_rate_group)
-        self.notification_rate_list = QListWidget()
-        self.notification_rate_layout.addWidget(self.notification_rate_list)
+        # 行はその場で書き換え、並べ替えはプロキシに任せる (レートの高い順)
+        self.rate_model = RateTableModel(parent=self)
+        self.rate_proxy = QSortFilterProxyModel(self)
+        self.rate_proxy.setSourceModel(self.rate_model)
+        self.rate_proxy.setSortRole(SORT_ROLE)
+        self.rate_proxy.setDynamicSortFilter(True)
+        self.notification_rate_table = QTableView()
+        self.notification_rate_table.setModel(self.rate_proxy)
+        self.notification_rate_table.setSortingEnabled(True)
+        self.notification_rate_table.sortByColumn(1, Qt.DescendingOrder)
+        self.notification_rate_table.verticalHeader().setVisible(False)
+        self.notification_rate_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.notification_rate_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.notification_rate_layout.addWidget(self.notification_rate_table)
         self.main_layout.addWidget(self.notification_rate_group)
-        self._device_rates: Dict[str, Dict[str, Any]] = {}
 
         # --- ログ出力 ---
         self.log_group = QGroupBox("ログ出力")
         self.log_layout = QVBoxLayout(self.log_group)
-        self.log_output = QTextEdit()
-        self.log_output.setReadOnly(True)
+        # 行数に上限のあるモデルに溜め、一定間隔でまとめて表示する
+        self.log_model = LogListModel(parent=self)
+        self.log_output = QListView()
+        self.log_output.setModel(self.log_model)
+        self.log_output.setUniformItemSizes(True)
+        self.log_output.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.log_output.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.log_model.rowsInserted.connect(self._scroll_log_to_bottom)
         self.log_layout.addWidget(self.log_output)
         self.main_layout.addWidget(self.log_group)
 
@@ -102,6 +133,8 @@ class BleApp(QWidget):
         self.early_press_layout = QVBoxLayout(self.early_press_group)
         self.status_label = QLabel("ゲーム状態: 停止中")
         self.early_press_layout.addWidget(self.status_label)
+        self.server_status_label = QLabel("サーバー: 未接続")
+        self.early_press_layout.addWidget(self.server_status_label)
 
         self.start_game_button = QPushButton("ゲーム開始")
         self.stop_game_button = QPushButton("ゲーム停止")
@@ -109,6 +142,7 @@ class BleApp(QWidget):
         self.early_press_layout.addWidget(self.stop_game_button)
 
         self.order_list_widget = QListWidget()
+        self._order_items: List[Dict[str, Any]] = []
         self.early_press_layout.addWidget(self.order_list_widget)
 
         self.main_layout.addWidget(self.early_press_group)
@@ -116,6 +150,8 @@ class BleApp(QWidget):
         self.start_game_button.clicked.connect(self.start_early_press_game)
         self.stop_game_button.clicked.connect(self.stop_early_press_game)
 
+        self.http = shared_http_client()
+
         # --- BleWorkerスレッド起動 ---
         self.ble_thread = QThread()
         self.ble_worker = BleWorker()
@@ -130,24 +166,38 @@ class BleApp(QWidget):
         self.ble_worker.services_discovered.connect(self._on_services_discovered)
         self.ble_worker.characteristics_discovered.connect(self._on_characteristics_discovered)
         self.ble_worker.early_press_order_updated.connect(self._update_early_press_order_display)
+        self.ble_worker.early_press_order_delta.connect(self._apply_early_press_order_delta)
         self.ble_worker.early_press_winner.connect(self._on_early_press_winner)
+        self.ble_worker.notify_started.connect(self._on_notify_started)
+        self.ble_worker.connect_all_finished.connect(self._on_connect_all_finished)
+        self.ble_worker.command_finished.connect(self._on_command_finished)
+        self.ble_worker.link_lost.connect(self._on_link_lost)
+        self.ble_worker.adv_mode_changed.connect(self._on_adv_mode_changed)
+        self.ble_worker.link_stats_updated.connect(self._on_link_stats_updated)
+
+        # ボタンの押下はサーバーの台帳へ直接流す (送信は start_services から)
+        self.press_forwarder = PressForwarder()
+        self.ble_worker.set_forwarder(self.press_forwarder)
 
         self.ble_thread.start()
         QCoreApplication.instance().aboutToQuit.connect(self._cleanup_ble_worker)
 
         self._update_connected_devices_display()
-
-        # --- Socket.IOクライアント ---
-        self.sio = socketio.Client()
-        self.sio.on('connect', self._on_socket_connect)
-        self.sio.on('disconnect', self._on_socket_disconnect)
-        self.sio.on('early_press_order_updated', self._on_early_press_order_updated)
-        self.sio.on('early_press_winner', self._on_early_press_winner)
-
-        self.sio_thread = threading.Thread(target=self._start_socketio_client)
-        self.sio_thread.daemon = True
-        self.sio_thread.start()
-
+        self.realtime = None
+
+    # サーバーとの通信を始める。起動を速くするため、ウィンドウを表示してから呼ぶ。
+    def start_services(self):
+        self.press_forwarder.start()
+
+        # --- サーバーのリアルタイム更新 (全ウィンドウで1本の接続を共有) ---
+        self.realtime = shared_realtime_client()
+        self.realtime.connection_changed.connect(self._on_server_connection_changed)
+        self.realtime.latency_updated.connect(self._on_server_latency_updated)
+        self.realtime.order_snapshot.connect(self._update_early_press_order_display)
+        self.realtime.order_deltas.connect(self._apply_early_press_order_deltas)
+        self.realtime.game_reset.connect(self._on_server_order_reset)
+        self.realtime.winner.connect(self._on_early_press_winner)
+        self.realtime.resync_failed.connect(self._log_request_error("順位取得"))
         self.fetch_current_order()
 
     # --- BLE設定関連メソッド ---
@@ -171,20 +221,28 @@ class BleApp(QWidget):
         self._log_message("BLEスキャンを開始します...")
         self.device_list_widget.clear()
         self.scanned_devices_map.clear()
+        self._scanned_items.clear()
         self.scan_button.setEnabled(False)
         self.ble_worker.start_scan()
 
     @Slot(dict)
     def _on_device_scanned(self, device_info: dict):
-        self._log_message(f"検出: {device_info['name']} ({device_info['address']}) RSSI: {device_info['rssi']}")
+        # 同じデバイスの広告は既存の行の RSSI だけを書き換える
+        address = device_info['address']
+        text = f"{device_info['name']} ({address}) - RSSI: {device_info['rssi']}"
+        self.scanned_devices_map[address] = device_info
+        item = self._scanned_items.get(address)
+        if item is not None:
+            item.setText(text)
+            return
+        self._log_message(f"検出: {device_info['name']} ({address}) RSSI: {device_info['rssi']}")
+        item = QListWidgetItem(text)
+        self.device_list_widget.addItem(item)
+        self._scanned_items[address] = item
 
     @Slot(list)
     def _on_scan_finished(self, devices: List[dict]):
         self._log_message(f"スキャンが完了しました。許可されたデバイス {len(devices)} 台を検出。")
-        for device in devices:
-            item = QListWidgetItem(f"{device['name']} ({device['address']}) - RSSI: {device['rssi']}")
-            self.device_list_widget.addItem(item)
-            self.scanned_devices_map[device['address']] = device
         self.scan_button.setEnabled(True)
 
     @Slot(QListWidgetItem)
@@ -198,20 +256,72 @@ class BleApp(QWidget):
         else:
             self._log_message("エラー: アドレス抽出失敗。", is_error=True)
 
+    @Slot()
+    def _connect_all_targets(self):
+        self._log_message(f"接続対象デバイスへ一括接続を開始します: {self.ble_worker.target_device_names}")
+        self.connect_all_button.setEnabled(False)
+        self.ble_worker.connect_all_targets()
+
+    @Slot(dict)
+    def _on_connect_all_finished(self, results: Dict[str, Any]):
+        succeeded = [name for name, message in results.items() if message is None]
+        self._log_message(f"一括接続が完了しました。成功 {len(succeeded)} / {len(results)} 台: {succeeded}")
+
     @Slot(str, str)
     def _on_connected(self, address: str, name: str):
+        # サービス・キャラクタリスティックの探索と通知開始は BleWorker 側で続けて行われる
         self._log_message(f"デバイス {name} ({address}) に正常に接続しました。")
         self._update_connected_devices_display()
-        self._log_message(f"サービス発見開始: {name} ({address})")
-        self.ble_worker.discover_services(address)
+
+    @Slot(str, str)
+    def _on_notify_started(self, address: str, char_uuid: str):
+        self._log_message(f"デバイス {address} の通知を開始しました ({char_uuid})。")
 
     @Slot(str)
     def _on_disconnected(self, address: str):
         self._log_message(f"デバイス {address} から切断しました。")
         self._update_connected_devices_display()
-        if address in self._device_rates:
-            del self._device_rates[address]
-            self._update_notification_rate_display()
+        self.rate_model.remove(address)
+
+    @Slot(bool)
+    def _toggle_adv_mode(self, checked: bool):
+        if checked:
+            self._log_message("アドバタイズ押下モードを開始します...")
+            self.ble_worker.start_adv_mode()
+        else:
+            self.ble_worker.stop_adv_mode()
+
+    @Slot(bool)
+    def _on_adv_mode_changed(self, active: bool):
+        self._log_message("アドバタイズ押下モードで受信中です。" if active else "アドバタイズ押下モードを停止しました。")
+        # 受信がエラーで止まった場合もボタンの状態を合わせる
+        self.adv_mode_button.blockSignals(True)
+        self.adv_mode_button.setChecked(active)
+        self.adv_mode_button.blockSignals(False)
+
+    @Slot(str, str)
+    def _on_link_lost(self, address: str, name: str):
+        self._log_message(f"デバイス {name} ({address}) との接続が切れました。自動で再接続します...", is_error=True)
+
+    @Slot(dict)
+    def _on_link_stats_updated(self, stats: Dict[str, Any]):
+        if stats["connected"]:
+            self._log_message(
+                f"デバイス {stats['name']} ({stats['address']}) に再接続しました。"
+                f"停止時間 {stats['last_downtime']:.1f} 秒 (累計 {stats['downtime_total']:.1f} 秒, 切断 {stats['disconnects']} 回)"
+            )
+        elif stats["attempts"]:
+            self._log_message(
+                f"デバイス {stats['name']} の再接続を試行中 ({stats['attempts']} 回目, 停止 {stats['current_downtime']:.1f} 秒)"
+            )
+
+    @Slot(str, bool)
+    def _on_command_finished(self, command: str, ok: bool):
+        # スキャンが失敗した場合も scan_finished は来ないのでここでボタンを戻す
+        if command == "scan":
+            self.scan_button.setEnabled(True)
+        elif command == "connect_all":
+            self.connect_all_button.setEnabled(True)
 
     @Slot(str)
     def _on_error_occurred(self, error: str):
@@ -221,7 +331,12 @@ class BleApp(QWidget):
         self.connected_devices_list.clear()
         connected = self.ble_worker.get_connected_targets()
         count = len(connected)
-        self.connected_count_label.setText(f"接続中: {count} / {MAX_ALLOWED_DEVICES} 台")
+        load = self.ble_worker.get_adapter_load()
+        if len(load) > 1:
+            per_adapter = ", ".join(f"{name}: {n}" for name, n in load.items())
+            self.connected_count_label.setText(f"接続中: {count} / {MAX_ALLOWED_DEVICES} 台 ({per_adapter})")
+        else:
+            self.connected_count_label.setText(f"接続中: {count} / {MAX_ALLOWED_DEVICES} 台")
 
         for addr, name in connected.items():
             item = QListWidgetItem(f"{name} ({addr})")
@@ -272,67 +387,44 @@ class BleApp(QWidget):
 
     @Slot(dict)
     def _on_notification_rate_updated(self, rate_info: Dict[str, Any]):
-        addr = rate_info["address"]
-        self._device_rates[addr] = rate_info
-        self._update_notification_rate_display()
-
-    def _update_notification_rate_display(self):
-        self.notification_rate_list.clear()
-        devices = sorted(
-            self._device_rates.values(),
-            key=lambda x: (x["rate_hz"] if x["rate_hz"] != float('inf') else -1.0,
-                           x["delay_ms"] if x["delay_ms"] != 0 else float('inf')),
-            reverse=True,
-        )
-        for d in devices:
-            rate_text = f"{d['rate_hz']:.2f} Hz" if d["rate_hz"] != float('inf') else "∞ Hz"
-            delay_text = f"{d['delay_ms']:.2f} ms" if d["delay_ms"] != float('inf') else "0 ms"
-            item_text = f"[{d['address'][-5:]}]: {rate_text} ({delay_text} 遅延)"
-            self.notification_rate_list.addItem(item_text)
+        # 反映は RateTableModel のタイマーでまとめて行う
+        name = self.ble_worker.get_connected_targets().get(rate_info["address"])
+        self.rate_model.update(dict(rate_info, name=name))
 
+    # どのスレッドから呼んでもよい (表示はモデルのタイマーでまとめて行う)
     def _log_message(self, message: str, is_error: bool = False):
-        cursor = self.log_output.textCursor()
-        cursor.movePosition(cursor.End)
-        if is_error:
-            original_format = cursor.charFormat()
-            error_format = original_format
-            error_format.setForeground(QColor("red"))
-            cursor.setCharFormat(error_format)
-            cursor.insertText(f"[{QCoreApplication.instance().applicationDisplayName()}] {message}\n")
-            cursor.setCharFormat(original_format)
-        else:
-            cursor.insertText(f"[{QCoreApplication.instance().applicationDisplayName()}] {message}\n")
-        self.log_output.setTextCursor(cursor)
-        self.log_output.ensureCursorVisible()
+        self.log_model.append(f"[{QCoreApplication.instance().applicationDisplayName()}] {message}", is_error)
+
+    def _scroll_log_to_bottom(self):
+        # 過去のログを読んでいるとき (一番下にいないとき) は勝手にスクロールしない
+        scroll_bar = self.log_output.verticalScrollBar()
+        if scroll_bar.value() >= scroll_bar.maximum() - 2 * max(1, scroll_bar.singleStep()):
+            self.log_output.scrollToBottom()
 
     def _cleanup_ble_worker(self):
         self._log_message("アプリケーション終了中。BLEワーカーをクリーンアップします...")
         self.ble_worker.cleanup()
+        self.press_forwarder.stop()
+        if self.realtime is not None:
+            self.realtime.stop()
+        self.http.shutdown()
         self.ble_thread.quit()
         self.ble_thread.wait()
 
     # 早押しゲーム関連
 
-    def _start_socketio_client(self):
-        try:
-            self.sio.connect('http://localhost:5000')
-            self.sio.wait()
-        except Exception as e:
-            self._log_message(f"Socket.IO接続エラー: {e}", is_error=True)
-
-    def _on_socket_connect(self):
-        self._log_message("Socket.IOに接続しました。")
-
-    def _on_socket_disconnect(self):
-        self._log_message("Socket.IOから切断されました。")
-
-    def _on_early_press_order_updated(self, order):
-        QMetaObject.invokeMethod(
-            self,
-            "_update_early_press_order_display",
-            Qt.QueuedConnection,
-            args=[order]
-        )
+    @Slot(bool)
+    def _on_server_connection_changed(self, connected: bool):
+        if connected:
+            self._log_message("Socket.IOに接続しました。")
+            self.server_status_label.setText("サーバー: 接続中")
+        else:
+            self._log_message("Socket.IOから切断されました。再接続します...")
+            self.server_status_label.setText("サーバー: 再接続中")
+
+    @Slot(float)
+    def _on_server_latency_updated(self, latency_ms: float):
+        self.server_status_label.setText(f"サーバー: 接続中 (遅延 {latency_ms:.1f} ms)")
 
     def _on_early_press_winner(self, winner):
         winner_name = winner.get("name", "不明")
@@ -340,45 +432,68 @@ class BleApp(QWidget):
         button_id = winner.get("button_id", "不明")
         self._log_message(f"勝者決定！ {winner_name} ({winner_addr}) ボタンID: {button_id}")
 
+    @staticmethod
+    def _format_order_item(item: Dict[str, Any]) -> str:
+        return f"{item['order']}位: {item['name']} (ボタンID: {item['button_id']})"
+
+    @Slot(dict)
+    def _on_server_order_reset(self, data: Dict[str, Any]):
+        self._update_early_press_order_display([])
+
     @Slot(list)
     def _update_early_press_order_display(self, order):
         self.order_list_widget.clear()
-        for item in order:
-            text = f"{item['order']}位: {item['name']} (ボタンID: {item['button_id']})"
-            self.order_list_widget.addItem(text)
+        self._order_items = [dict(item) for item in order]
+        for item in self._order_items:
+            self.order_list_widget.addItem(self._format_order_item(item))
+
+    @Slot(dict)
+    def _apply_early_press_order_delta(self, delta: Dict[str, Any]):
+        # 追加された1件だけを挿入し、順位が繰り下がった行だけ書き換える
+        row = delta["order"] - 1
+        self._order_items.insert(row, dict(delta))
+        self.order_list_widget.insertItem(row, self._format_order_item(delta))
+        for i in range(row + 1, len(self._order_items)):
+            self._order_items[i]["order"] = i + 1
+            self.order_list_widget.item(i).setText(self._format_order_item(self._order_items[i]))
+
+    # 差分は RealtimeClient が順番を確認した上でまとめて届ける
+    @Slot(list)
+    def _apply_early_press_order_deltas(self, deltas: List[Dict[str, Any]]):
+        for delta in deltas:
+            self._apply_early_press_order_delta(delta)
+
+    # サーバーへのリクエストはすべて HttpClient のスレッドで行い、結果はシグナルで受け取る
+    def _log_request_result(self, label: str):
+        def _on_finished(status: int, data: Any):
+            if 200 <= status < 300:
+                self._log_message(f"{label}リクエスト成功。")
+            else:
+                self._log_message(f"{label}リクエスト失敗: {status}", is_error=True)
+        return _on_finished
+
+    def _log_request_error(self, label: str):
+        return lambda error: self._log_message(f"{label}リクエスト例外: {error}", is_error=True)
 
     def start_early_press_game(self):
         self.status_label.setText("ゲーム状態: 開始中")
-        try:
-            resp = requests.post('http://localhost:5000/early_press/start')
-            if resp.ok:
-                self._log_message("早押しゲーム開始リクエスト成功。")
-            else:
-                self._log_message(f"早押しゲーム開始リクエスト失敗: {resp.status_code}", is_error=True)
-        except Exception as e:
-            self._log_message(f"早押しゲーム開始リクエスト例外: {e}", is_error=True)
+        self.http.post(
+            '/early_press/start',
+            self._log_request_result("早押しゲーム開始"),
+            self._log_request_error("早押しゲーム開始"),
+        )
 
     def stop_early_press_game(self):
         self.status_label.setText("ゲーム状態: 停止中")
-        try:
-            resp = requests.post('http://localhost:5000/early_press/stop')
-            if resp.ok:
-                self._log_message("早押しゲーム停止リクエスト成功。")
-            else:
-                self._log_message(f"早押しゲーム停止リクエスト失敗: {resp.status_code}", is_error=True)
-        except Exception as e:
-            self._log_message(f"早押しゲーム停止リクエスト例外: {e}", is_error=True)
+        self.http.post(
+            '/early_press/stop',
+            self._log_request_result("早押しゲーム停止"),
+            self._log_request_error("早押しゲーム停止"),
+        )
 
+    # 結果は RealtimeClient の order_snapshot で届く
     def fetch_current_order(self):
-        try:
-            resp = requests.get('http://localhost:5000/early_press/current_order')
-            if resp.ok:
-                order = resp.json().get('order', [])
-                self._update_early_press_order_display(order)
-            else:
-                self._log_message(f"順位取得失敗: {resp.status_code}", is_error=True)
-        except Exception as e:
-            self._log_message(f"順位取得例外: {e}", is_error=True)
+        self.realtime.resync()
 
 
 if __name__ == "__main__":
@@ -386,4 +501,5 @@ if __name__ == "__main__":
     app.setApplicationDisplayName("BLE App")
     window = BleApp()
     window.show()
+    QTimer.singleShot(0, window.start_services)
     sys.exit(app.exec())
@@ -0,0 +1,125 @@
+# http_client.py
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from PySide6.QtCore import QObject, Signal
+
+from constants import (
+    SERVER_URL,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_RETRIES,
+    HTTP_MAX_WORKERS,
+)
+
+
+# 1回のリクエストの結果。シグナルは呼び出し元 (GUI) スレッドに届く。
+class HttpReply(QObject):
+    finished = Signal(int, object)  # ステータスコード, JSON (JSON でなければ None)
+    failed = Signal(str)            # 接続できない・タイムアウトなど
+
+
+# GUI スレッドをブロックしない HTTP クライアント。
+# keep-alive の Session を使い回し、リクエストは専用スレッドで実行して結果をシグナルで返す。
+# 再試行は接続失敗と 502/503/504 だけ (応答待ちのタイムアウトは、サーバー側で処理済みかもしれないので再送しない)。
+# requests は起動を遅くするので、最初のリクエストのときにワーカースレッドで読み込む。
+class HttpClient(QObject):
+    def __init__(self, base_url: str = SERVER_URL, max_workers: int = HTTP_MAX_WORKERS, parent=None):
+        super().__init__(parent)
+        self.base_url = base_url.rstrip("/")
+        self._timeout = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+        self._max_workers = max_workers
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="HttpClient")
+
+    def _get_session(self):
+        with self._session_lock:
+            if self._session is None:
+                self._session = self._create_session()
+            return self._session
+
+    def _create_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=HTTP_RETRIES,
+            connect=HTTP_RETRIES,
+            read=0,
+            status=HTTP_RETRIES,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET", "POST"}),
+            backoff_factor=0.2,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=1, pool_maxsize=self._max_workers)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    # ワーカースレッドで呼ばれる
+    def _send(self, method: str, url: str, **kwargs: Any):
+        return self._get_session().request(method, url, **kwargs)
+
+    # 結果を受け取るコールバックは送信前につなぐ (すぐに終わった場合の取りこぼし防止)
+    def request(
+        self,
+        method: str,
+        path: str,
+        on_finished: Optional[Callable[[int, Any], None]] = None,
+        on_failed: Optional[Callable[[str], None]] = None,
+        **kwargs: Any,
+    ) -> HttpReply:
+        reply = HttpReply(self)
+        if on_finished is not None:
+            reply.finished.connect(on_finished)
+        if on_failed is not None:
+            reply.failed.connect(on_failed)
+        reply.finished.connect(reply.deleteLater)
+        reply.failed.connect(reply.deleteLater)
+
+        kwargs.setdefault("timeout", self._timeout)
+        future = self._executor.submit(self._send, method, self.base_url + path, **kwargs)
+        future.add_done_callback(lambda f: self._deliver(reply, f))
+        return reply
+
+    def get(self, path: str, on_finished=None, on_failed=None, **kwargs: Any) -> HttpReply:
+        return self.request("GET", path, on_finished, on_failed, **kwargs)
+
+    def post(self, path: str, on_finished=None, on_failed=None, **kwargs: Any) -> HttpReply:
+        return self.request("POST", path, on_finished, on_failed, **kwargs)
+
+    # ワーカースレッドで呼ばれる
+    @staticmethod
+    def _deliver(reply: HttpReply, future: Future):
+        try:
+            response = future.result()
+        except Exception as e:
+            reply.failed.emit(str(e))
+            return
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        reply.finished.emit(response.status_code, data)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._session is not None:
+            self._session.close()
+
+
+_shared_client: Optional[HttpClient] = None
+
+
+# BleApp と EarlyPressManager で1つの接続プールを共有する (GUI スレッドから呼ぶ)
+def shared_http_client() -> HttpClient:
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = HttpClient()
+    return _shared_client
@@ -0,0 +1,105 @@
+# import_profile.py
+#
+# 起動時間の計測。
+# - HAYAOSHI_STARTUP_PROFILE=1 で main.py / app.py を起動すると、起動の節目 (mark) ごとの経過時間と、
+#   その時点で読み込まれている重いモジュールを表示する。経過時間はこのモジュールを import した時点から数える。
+# - python import_profile.py gui_app app で、各モジュールの import にかかる時間を
+#   python -X importtime で測り、重いパッケージの順に表示する。
+
+# app.py では eventlet の monkey_patch より前に読み込まれるので、threading を引き込むものは使う所で import する
+import os
+import sys
+import time
+from typing import List, NamedTuple, Tuple
+
+ENABLED = os.environ.get("HAYAOSHI_STARTUP_PROFILE", "0") == "1"
+# 起動時には読み込まず、最初に使うときまで遅らせているモジュール
+DEFERRED_MODULES = ("bleak", "socketio", "requests", "sqlalchemy", "flask_sqlalchemy")
+
+_started = time.perf_counter()
+_marks: List[Tuple[str, float]] = []
+
+
+def mark(label: str):
+    if ENABLED:
+        _marks.append((label, time.perf_counter() - _started))
+
+
+def report():
+    if not ENABLED or not _marks:
+        return
+    print("起動時間:")
+    for label, elapsed in _marks:
+        print(f"  {elapsed * 1000:8.1f} ms  {label}")
+    loaded = [name for name in DEFERRED_MODULES if name in sys.modules]
+    print(f"  読み込み済みの重いモジュール: {', '.join(loaded) if loaded else 'なし'}")
+    _marks.clear()
+
+
+class ImportTime(NamedTuple):
+    name: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+# python -X importtime -c "import <module>" の出力を読む
+def measure_imports(module: str) -> List[ImportTime]:
+    import subprocess
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    entries: List[ImportTime] = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # 見出し行
+        field = parts[2][1:]
+        name = field.lstrip()
+        entries.append(ImportTime(name, int(parts[0]), int(parts[1]), (len(field) - len(name)) // 2))
+    if result.returncode != 0:
+        message = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else ""
+        raise RuntimeError(f"{module} を import できませんでした: {message}")
+    return entries
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="モジュールの import 時間を測る")
+    parser.add_argument("modules", nargs="*", default=["gui_app", "app"], help="測るモジュール")
+    parser.add_argument("--top", type=int, default=15, help="表示するパッケージ数")
+    args = parser.parse_args()
+
+    for module in args.modules:
+        try:
+            entries = measure_imports(module)
+        except RuntimeError as e:
+            print(e)
+            continue
+        index = next((i for i, e in enumerate(entries) if e.name == module and e.depth == 0), None)
+        if index is None:
+            print(f"{module}: 読み込み済み (計測できませんでした)")
+            continue
+        # 子の行は親の行より前に出るので、直前の深さ0の行までが module の読み込んだもの
+        start = index
+        while start > 0 and entries[start - 1].depth > 0:
+            start -= 1
+        subtree = entries[start:index]
+        print(f"{module}: {entries[index].cumulative_us / 1000:.1f} ms")
+        # 入れ子の重複を避けるため、トップレベルのパッケージ単位で並べる
+        packages = [e for e in subtree if "." not in e.name]
+        for entry in sorted(packages, key=lambda e: e.cumulative_us, reverse=True)[:args.top]:
+            print(f"  {entry.cumulative_us / 1000:8.1f} ms  {entry.name}")
+        deferred = sorted({e.name.split(".")[0] for e in subtree} & set(DEFERRED_MODULES))
+        print(f"  遅延読み込みのはずが読み込まれたモジュール: {', '.join(deferred) if deferred else 'なし'}")
+
+
+if __name__ == "__main__":
+    main()
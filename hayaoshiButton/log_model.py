@@ -0,0 +1,146 @@
+# log_model.py
+
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Tuple
+
+from PySide6.QtCore import QAbstractListModel, QAbstractTableModel, QModelIndex, QTimer, Qt
+from PySide6.QtGui import QColor
+
+from constants import LOG_MAX_LINES, GUI_FLUSH_INTERVAL_MS
+
+SORT_ROLE = Qt.UserRole + 1  # 並べ替えに使う数値
+
+
+# 行数に上限のあるログ表示用モデル。
+# append() はどのスレッドからでも呼べて、追加分はタイマーでまとめてビューに反映する。
+class LogListModel(QAbstractListModel):
+    def __init__(self, max_lines: int = LOG_MAX_LINES, interval_ms: int = GUI_FLUSH_INTERVAL_MS, parent=None):
+        super().__init__(parent)
+        self._max_lines = max(1, max_lines)
+        self._lines: Deque[Tuple[str, bool]] = deque()
+        self._pending: List[Tuple[str, bool]] = []
+        self._lock = threading.Lock()
+        self._error_color = QColor("red")
+        self._timer = QTimer(self)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self.flush)
+        self._timer.start()
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._lines)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole) -> Any:
+        if not index.isValid() or index.row() >= len(self._lines):
+            return None
+        text, is_error = self._lines[index.row()]
+        if role == Qt.DisplayRole:
+            return text
+        if role == Qt.ForegroundRole and is_error:
+            return self._error_color
+        return None
+
+    def append(self, text: str, is_error: bool = False):
+        with self._lock:
+            self._pending.append((text, is_error))
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending[-self._max_lines:], []
+
+        overflow = len(self._lines) + len(pending) - self._max_lines
+        if overflow > 0:
+            self.beginRemoveRows(QModelIndex(), 0, overflow - 1)
+            for _ in range(overflow):
+                self._lines.popleft()
+            self.endRemoveRows()
+
+        first = len(self._lines)
+        self.beginInsertRows(QModelIndex(), first, first + len(pending) - 1)
+        self._lines.extend(pending)
+        self.endInsertRows()
+
+
+# 通知レートの表。1台1行で、更新は行ごとにその場で書き換える。
+# update() の結果はタイマーでまとめて反映するので、通知が多くても描画は一定間隔に収まる。
+class RateTableModel(QAbstractTableModel):
+    HEADERS = ["デバイス", "レート (Hz)", "遅延 (ms)"]
+
+    def __init__(self, interval_ms: int = GUI_FLUSH_INTERVAL_MS, parent=None):
+        super().__init__(parent)
+        self._rows: List[Dict[str, Any]] = []
+        self._row_of: Dict[str, int] = {}  # アドレス -> 行番号
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._timer = QTimer(self)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self.flush)
+        self._timer.start()
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole) -> Any:
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+        info = self._rows[index.row()]
+        column = index.column()
+        if role == SORT_ROLE:
+            if column == 0:
+                return info.get("name") or info["address"]
+            value = info["rate_hz"] if column == 1 else info["delay_ms"]
+            return -1.0 if value == float('inf') else value
+        if role == Qt.DisplayRole:
+            if column == 0:
+                name = info.get("name")
+                return f"{name} [{info['address'][-5:]}]" if name else f"[{info['address'][-5:]}]"
+            if column == 1:
+                return f"{info['rate_hz']:.2f}" if info["rate_hz"] != float('inf') else "∞"
+            return f"{info['delay_ms']:.2f}" if info["delay_ms"] != float('inf') else "0"
+        if role == Qt.TextAlignmentRole and column > 0:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def update(self, info: Dict[str, Any]):
+        self._pending[info["address"]] = info
+
+    def remove(self, address: str):
+        self._pending.pop(address, None)
+        row = self._row_of.pop(address, None)
+        if row is None:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._rows[row]
+        self.endRemoveRows()
+        for address_after, index in self._row_of.items():
+            if index > row:
+                self._row_of[address_after] = index - 1
+
+    def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        new_rows = []
+        for address, info in pending.items():
+            row = self._row_of.get(address)
+            if row is None:
+                new_rows.append(info)
+                continue
+            self._rows[row] = dict(info)
+            self.dataChanged.emit(self.index(row, 0), self.index(row, 2))
+        if new_rows:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(new_rows) - 1)
+            for info in new_rows:
+                self._row_of[info["address"]] = len(self._rows)
+                self._rows.append(dict(info))
+            self.endInsertRows()
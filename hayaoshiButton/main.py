@@ -1,15 +1,29 @@
 # main.py
 
+import import_profile  # 起動時間の計測 (HAYAOSHI_STARTUP_PROFILE=1 のとき) のため最初に読み込む
+
 import sys
 from PySide6.QtWidgets import QApplication
-from PySide6.QtCore import QCoreApplication
+from PySide6.QtCore import QTimer
 
 # gui_app.py から BleApp クラスをインポート
 from gui_app import BleApp
 
+import_profile.mark("import 完了")
+
+
+def _on_first_event():
+    import_profile.mark("イベントループ開始")
+    import_profile.report()
+
+
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     app.setApplicationDisplayName("BLE App")  # ログ表示用
     window = BleApp()
     window.show()
+    import_profile.mark("ウィンドウ表示")
+    # サーバーとの通信 (socketio / requests の読み込みを含む) はウィンドウを出してから始める
+    QTimer.singleShot(0, window.start_services)
+    QTimer.singleShot(0, _on_first_event)
     sys.exit(app.exec())
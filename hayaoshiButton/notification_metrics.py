@@ -0,0 +1,60 @@
+# notification_metrics.py
+
+from array import array
+from typing import Any, Dict
+
+from constants import RATE_BUFFER_SIZE
+
+
+# デバイス1台分の通知レート計測。
+# 直近 RATE_BUFFER_SIZE 件の受信時刻をリングバッファに持ち、
+# 受信ごとにレートと平均間隔を O(1) で更新する (通知ごとの確保なし)。
+class NotificationMetrics:
+    __slots__ = (
+        "address", "char_uuid", "rate_hz", "delay_ms", "last_timestamp",
+        "dirty", "_timestamps", "_index", "_count",
+    )
+
+    def __init__(self, address: str, char_uuid: str = "", size: int = RATE_BUFFER_SIZE):
+        self.address = address
+        self.char_uuid = char_uuid
+        self._timestamps = array("d", [0.0]) * max(2, size)
+        self.reset(0.0)
+
+    def reset(self, now: float):
+        self.rate_hz = 0.0
+        self.delay_ms = 0.0
+        self.last_timestamp = now
+        self.dirty = False
+        self._index = 0
+        self._count = 0
+
+    def record(self, now: float):
+        timestamps = self._timestamps
+        size = len(timestamps)
+        timestamps[self._index] = now
+        self._index = (self._index + 1) % size
+        if self._count < size:
+            self._count += 1
+        self.last_timestamp = now
+
+        count = self._count
+        if count >= 2:
+            # 満杯なら次の書き込み位置が最古のサンプル
+            oldest = timestamps[self._index] if count == size else timestamps[0]
+            span = now - oldest
+            if span > 0:
+                self.rate_hz = (count - 1) / span
+                self.delay_ms = span / (count - 1) * 1000
+            else:
+                self.rate_hz = float('inf')
+                self.delay_ms = 0.0
+        self.dirty = True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "address": self.address,
+            "char_uuid": self.char_uuid,
+            "rate_hz": self.rate_hz,
+            "delay_ms": self.delay_ms,
+        }
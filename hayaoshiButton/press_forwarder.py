@@ -0,0 +1,259 @@
+# press_forwarder.py
+
+import collections
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from constants import (
+    SERVER_URL,
+    FORWARD_BATCH_INTERVAL,
+    FORWARD_MAX_BATCH,
+    FORWARD_BUFFER_SIZE,
+    FORWARD_ACK_TIMEOUT,
+    FORWARD_HOLD_WINDOW,
+)
+
+
+# BLE で受け取った押下をゲームサーバーへ流し続ける転送役。
+# 1本の Socket.IO 接続を張りっぱなしにし (切れたら指数バックオフで張り直す)、
+# 押下は button_pressed_batch でまとめて送る。
+# サーバーの受領応答 (ack) が返るまではバッファから消さないので、
+# 切断中の押下は再接続後に元のタイムスタンプのまま送り直される。
+# サーバーのラウンド開始・終了の通知を受けて、受付中のラウンドで各アドレスの最初の押下だけを送る
+# (押しっぱなしや連打で送信とバッファが埋まらないように)。受付状態が分からない間はすべて送る。
+# journal (EventJournal) を渡すと、ラウンドの開始・終了と送った押下をサーバーと同じ壁時計で記録する。
+class PressForwarder:
+    def __init__(
+        self,
+        url: str = SERVER_URL,
+        batch_interval: float = FORWARD_BATCH_INTERVAL,
+        max_batch: int = FORWARD_MAX_BATCH,
+        buffer_size: int = FORWARD_BUFFER_SIZE,
+        ack_timeout: float = FORWARD_ACK_TIMEOUT,
+        hold_window: float = FORWARD_HOLD_WINDOW,
+        client_factory: Optional[Callable[..., Any]] = None,
+        journal=None,
+    ):
+        self.url = url
+        self._batch_interval = batch_interval
+        self._max_batch = max(1, max_batch)
+        self._buffer_size = buffer_size
+        self._ack_timeout = ack_timeout
+        self._hold_window = hold_window
+        self._buffer: Deque[Dict[str, Any]] = collections.deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._client_factory = client_factory
+        self._journal = journal
+        self._sio = None  # socketio は読み込みが重いので転送スレッドで作る
+        # BleWorker の時刻は time.monotonic() 基準なので、サーバー側に合わせて壁時計に直す
+        self._wall_offset = time.time() - time.monotonic()
+        self._round_active: Optional[bool] = None  # None はサーバーの受付状態がまだ分からない
+        self._round_started_at: Optional[float] = None
+        self._forwarded = set()  # このラウンドで送ったアドレス
+        # 送った押下の (アドレス, 押下時刻)。受付状態が分からない間に送った押下を、
+        # ラウンドが分かったときにそのラウンドの送信済みとして数えるために残す
+        self._sent_log: Deque[Tuple[str, float]] = collections.deque(maxlen=buffer_size)
+        # 受付外に届いた押下。開始通知より先に届いた押下を開始時に拾うため、しばらく取っておく
+        self._held: Deque[Dict[str, Any]] = collections.deque()
+        self.sent = 0
+        self.dropped = 0
+        self.filtered = 0  # ラウンド外・2回目以降として送らなかった件数
+
+    @property
+    def connected(self) -> bool:
+        return self._sio is not None and self._sio.connected
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="PressForwarder", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self.connected:
+            try:
+                self._sio.disconnect()
+            except Exception:
+                pass
+
+    # BLE の通知ハンドラから呼ばれる。バッファに積むだけですぐ戻る。
+    # 送る (または開始通知待ちで取っておく) なら True、ラウンドに関係ない押下として捨てたら False。
+    def forward(
+        self,
+        address: str,
+        button_id: int,
+        timestamp: float,
+        host_time: Optional[float] = None,
+        device_time: Optional[int] = None,
+        name: Optional[str] = None,
+    ):
+        press = {
+            "address": address,
+            "button_id": button_id,
+            "timestamp": timestamp + self._wall_offset,
+            "host_time": (host_time if host_time is not None else timestamp) + self._wall_offset,
+            "device_time": device_time,
+            "name": name,
+        }
+        with self._lock:
+            if self._round_active is False:
+                return self._hold(press)
+            if self._round_active:
+                if address in self._forwarded:
+                    self.filtered += 1
+                    return False
+                self._forwarded.add(address)
+            self._enqueue(press)
+        self._wakeup.set()
+        return True
+
+    # 以下3つは self._lock を持った状態で呼ぶ (ジャーナルにラウンドの区切りと押下を同じ順で残すため)
+    def _enqueue(self, press: Dict[str, Any]):
+        self._sent_log.append((press["address"], press["timestamp"]))
+        if self._journal is not None:
+            self._journal.press(press["address"], press["button_id"], press["timestamp"],
+                                press["host_time"], press["device_time"])
+        if len(self._buffer) >= self._buffer_size:
+            self._buffer.popleft()
+            self.dropped += 1
+        self._buffer.append(press)
+
+    def _hold(self, press: Dict[str, Any]) -> bool:
+        held = self._held
+        while held and held[0]["host_time"] < press["host_time"] - self._hold_window:
+            held.popleft()
+            self.filtered += 1
+        if any(p["address"] == press["address"] for p in held):
+            self.filtered += 1
+            return False
+        held.append(press)
+        return True
+
+    def _set_round(self, active: Optional[bool], started_at: Optional[float]):
+        if self._journal is not None:
+            if active:
+                self._journal.game_start(started_at if started_at is not None else time.time())
+            elif self._round_active:
+                self._journal.game_stop()
+        self._round_active = active
+        self._round_started_at = started_at
+        # 開始時刻以降に押されて既に送った押下 (状態が分かる前に送ったものを含む) はこのラウンドの分
+        if active and started_at is not None:
+            self._forwarded = {address for address, timestamp in self._sent_log if timestamp >= started_at}
+        else:
+            self._forwarded = set()
+        held, self._held = self._held, collections.deque()
+        if not active:
+            self.filtered += len(held)
+            return
+        # 開始通知より先に届いていた、開始後の押下だけを送る
+        for press in held:
+            if (started_at is not None and press["timestamp"] < started_at) or press["address"] in self._forwarded:
+                self.filtered += 1
+                continue
+            self._forwarded.add(press["address"])
+            self._enqueue(press)
+
+    # --- サーバーからの受付状態の通知 (Socket.IO のスレッドで呼ばれる) ---
+    def _on_game_reset(self, data: Any = None):
+        started_at = data.get("started_at") if isinstance(data, dict) else None
+        with self._lock:
+            self._set_round(True, started_at)
+        self._wakeup.set()
+
+    def _on_game_stopped(self, _data: Any = None):
+        with self._lock:
+            self._set_round(False, None)
+
+    def _sync_round_state(self):
+        try:
+            state = self._sio.call('early_press_state', timeout=self._ack_timeout)
+        except Exception:
+            state = None
+        with self._lock:
+            if not isinstance(state, dict):
+                # 問い合わせに答えないサーバーでは絞り込まずにすべて送る
+                self._set_round(None, None)
+            elif state.get("active"):
+                if self._round_active is not True or self._round_started_at != state.get("started_at"):
+                    self._set_round(True, state.get("started_at"))
+            elif self._round_active is not False:
+                self._set_round(False, None)
+
+    def _connect(self) -> bool:
+        try:
+            self._sio.connect(self.url, wait_timeout=self._ack_timeout)
+            return True
+        except Exception as e:
+            print(f"押下転送: サーバーに接続できませんでした ({self.url}): {e}")
+            return False
+
+    def _create_client(self):
+        client_factory = self._client_factory
+        if client_factory is None:
+            import socketio
+            client_factory = socketio.Client
+        # 再接続は _run が自前で行う (送り直しのタイミングをこちらで握るため)
+        sio = client_factory(reconnection=False)
+        sio.on('early_press_game_reset', self._on_game_reset)
+        sio.on('early_press_game_stopped', self._on_game_stopped)
+        return sio
+
+    def _run(self):
+        if self._sio is None:
+            self._sio = self._create_client()
+        retry_delay = 0.5
+        while not self._stopped.is_set():
+            if not self._sio.connected:
+                if not self._connect():
+                    self._stopped.wait(retry_delay)
+                    retry_delay = min(retry_delay * 2, 5.0)
+                    continue
+                retry_delay = 0.5
+                # 切断中にラウンドが切り替わっていても取りこぼさないよう、接続のたびに問い合わせる
+                self._sync_round_state()
+
+            if not self._buffer:
+                self._wakeup.wait(1.0)
+                self._wakeup.clear()
+                continue
+            # 同時に押されたボタンを1回で送れるよう少しだけ待つ
+            if self._batch_interval > 0:
+                self._stopped.wait(self._batch_interval)
+            while self._buffer and not self._stopped.is_set():
+                if not self._send_batch():
+                    self._stopped.wait(0.2)
+                    break
+
+    def _send_batch(self) -> bool:
+        with self._lock:
+            batch: List[Dict[str, Any]] = [
+                self._buffer[i] for i in range(min(len(self._buffer), self._max_batch))
+            ]
+        if not self._sio.connected:
+            return False
+        try:
+            self._sio.call('button_pressed_batch', batch, timeout=self._ack_timeout)
+        except Exception:
+            return False
+        with self._lock:
+            # 送信中に古いものが捨てられていたら、その分は既に消えている
+            for press in batch:
+                if self._buffer and self._buffer[0] is press:
+                    self._buffer.popleft()
+        self.sent += len(batch)
+        return True
@@ -0,0 +1,64 @@
+# press_ledger.py
+
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional
+
+UNKNOWN_DEVICE_NAME = "不明なデバイス"
+
+
+# 早押しの受付台帳。
+# 押したアドレスを set で管理して重複を O(1) で弾き、
+# 押下時刻で二分探索して挿入位置 (= 順位) を決める。
+# add() は全体の順位表ではなく、追加された1件と順位 (差分) だけを返す。
+class PressLedger:
+    def __init__(self):
+        self._seen = set()
+        self._timestamps: List[float] = []
+        self._entries: List[Dict[str, Any]] = []
+        self.seq = 0  # 台帳が変わるたびに増える通し番号 (リセットでも増える)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, address: str) -> bool:
+        return address in self._seen
+
+    @property
+    def winner(self) -> Optional[Dict[str, Any]]:
+        return dict(self._entries[0]) if self._entries else None
+
+    def add(
+        self,
+        address: str,
+        button_id: int,
+        timestamp: float,
+        name: str = UNKNOWN_DEVICE_NAME,
+        **extra: Any,
+    ) -> Optional[Dict[str, Any]]:
+        if address in self._seen:
+            return None
+
+        # 同時刻なら先に届いた方を上位にする
+        index = bisect_right(self._timestamps, timestamp)
+        self._timestamps.insert(index, timestamp)
+        entry = {
+            "address": address,
+            "button_id": button_id,
+            "timestamp": timestamp,
+            "name": name,
+        }
+        entry.update(extra)
+        self._entries.insert(index, entry)
+        # 挿入に成功してから押下済みにする (不正な timestamp で失敗したアドレスを締め出さない)
+        self._seen.add(address)
+        self.seq += 1
+        return dict(entry, order=index + 1, seq=self.seq)
+
+    def reset(self):
+        self._seen.clear()
+        self._timestamps.clear()
+        self._entries.clear()
+        self.seq += 1
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [dict(entry, order=i + 1) for i, entry in enumerate(self._entries)]
@@ -0,0 +1,76 @@
+# ranking_cache.py
+
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+
+# ランキングを計算済みの形で持ち、ポイントが変わったときだけ作り直すキャッシュ。
+# 同じ内容なら同じ ETag を返すので、表示端末の自動更新は 304 で済む。
+class RankingCache:
+    def __init__(self, loader: Callable[[], List[Dict[str, Any]]]):
+        self._loader = loader  # [{"name":..., "points":...}, ...] をポイント降順で返す関数
+        self._lock = threading.Lock()
+        self._players: Optional[List[Dict[str, Any]]] = None
+        self._ranking: List[Dict[str, Any]] = []
+        self._etag = ""
+        self._json = ""
+        self._html: Optional[str] = None
+
+    @staticmethod
+    def build_ranking(players: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        ranking = []
+        last_point = None
+        last_rank = 0
+        for player in players:
+            if player["points"] != last_point:
+                last_rank = len(ranking) + 1
+                last_point = player["points"]
+            ranking.append({"rank": last_rank, "name": player["name"], "points": player["points"]})
+        return ranking
+
+    def _rebuild(self):
+        self._ranking = self.build_ranking(self._players)
+        self._json = json.dumps({"ranking": self._ranking}, ensure_ascii=False)
+        self._etag = hashlib.sha1(self._json.encode("utf-8")).hexdigest()
+        self._html = None
+
+    def _ensure_loaded(self):
+        if self._players is None:
+            players = self._loader()
+            if not players:
+                raise ValueError("データなし")
+            self._players = [dict(p) for p in players]
+            self._rebuild()
+
+    def invalidate(self):
+        with self._lock:
+            self._players = None
+
+    # 1人分のポイント変化をその場で反映する (DB を読み直さない)
+    def apply_points(self, name: str, points: int):
+        with self._lock:
+            if self._players is None:
+                return
+            for player in self._players:
+                if player["name"] == name:
+                    player["points"] = points
+                    break
+            else:
+                self._players.append({"name": name, "points": points})
+            self._players.sort(key=lambda p: p["points"], reverse=True)
+            self._rebuild()
+
+    def get(self) -> Dict[str, Any]:
+        with self._lock:
+            self._ensure_loaded()
+            return {"ranking": self._ranking, "etag": self._etag, "json": self._json}
+
+    # 描画済み HTML もキャッシュする。render は ranking を受け取って HTML を返す関数。
+    def rendered(self, render: Callable[[List[Dict[str, Any]]], str]) -> Dict[str, Any]:
+        with self._lock:
+            self._ensure_loaded()
+            if self._html is None:
+                self._html = render(self._ranking)
+            return {"html": self._html, "etag": self._etag}
@@ -0,0 +1,202 @@
+# realtime_client.py
+
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from PySide6.QtCore import QObject, QTimer, Signal, Slot
+
+from constants import SERVER_URL, REALTIME_COALESCE_MS, REALTIME_PING_INTERVAL
+from http_client import shared_http_client
+from reconnect import ExponentialBackoff
+
+
+# デスクトップ側の全ウィンドウで共有する Socket.IO クライアント。
+# - 接続は専用スレッドで張り、切れたらジッター付き指数バックオフで張り直す
+# - (再) 接続のたびに /early_press/current_order で全体を取り直し、order_snapshot で配る
+# - 差分は seq で順番を確認し、欠落があれば全体を取り直す (取り直し中の差分は保留して後で当てる)
+# - 受信したイベントは REALTIME_COALESCE_MS ごとにまとめて GUI スレッドに渡す
+# - 定期的に latency_ping を送り、往復遅延を latency_updated で知らせる
+class RealtimeClient(QObject):
+    connection_changed = Signal(bool)
+    order_snapshot = Signal(list)   # 順位全体 (接続直後・欠落からの復帰時)
+    order_deltas = Signal(list)     # 順番どおりに並んだ差分 (1回の反映分をまとめて)
+    game_reset = Signal(dict)
+    game_stopped = Signal()
+    winner = Signal(dict)
+    score_updated = Signal(dict)
+    latency_updated = Signal(float)  # 往復遅延 (ms)
+    resync_failed = Signal(str)
+    _resync_requested = Signal()
+
+    def __init__(self, url: str = SERVER_URL, parent=None):
+        super().__init__(parent)
+        self.url = url
+        self.seq = 0  # 最後に反映した差分の通し番号
+        self.latency_ms: Optional[float] = None
+        self._http = shared_http_client()
+        self._sio = None  # socketio は読み込みが重いので接続スレッドで作る
+
+        self._pending: List[Tuple[str, Any]] = []
+        self._lock = threading.Lock()
+        self._resyncing = False
+        self._held: List[Dict[str, Any]] = []  # 取り直し中に届いた差分
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(REALTIME_COALESCE_MS)
+        self._timer.timeout.connect(self._drain)
+        self._resync_requested.connect(self.resync)
+
+    @property
+    def connected(self) -> bool:
+        return self._sio is not None and self._sio.connected
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._timer.start()
+        self._thread = threading.Thread(target=self._run, name="RealtimeClient", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._timer.stop()
+        if self.connected:
+            try:
+                self._sio.disconnect()
+            except Exception:
+                pass
+
+    # --- 接続スレッド ---
+    def _create_client(self):
+        import socketio
+
+        sio = socketio.Client(reconnection=False)
+        sio.on('connect', self._on_connect)
+        sio.on('disconnect', self._on_disconnect)
+        for event in ('early_press_order_delta', 'early_press_game_reset', 'early_press_game_stopped',
+                      'early_press_winner', 'score_updated'):
+            sio.on(event, self._queue_handler(event))
+        return sio
+
+    def _run(self):
+        if self._sio is None:
+            self._sio = self._create_client()
+        backoff = ExponentialBackoff()
+        while not self._stopped.is_set():
+            try:
+                self._sio.connect(self.url)
+            except Exception:
+                self._stopped.wait(backoff.next_delay())
+                continue
+            backoff.reset()
+            # 接続中は定期的に遅延を測る。切断されたらループを抜けて張り直す
+            while self._sio.connected and not self._stopped.wait(REALTIME_PING_INTERVAL):
+                self._ping()
+
+    def _ping(self):
+        sent = time.monotonic()
+        try:
+            self._sio.call('latency_ping', {"t": sent}, timeout=REALTIME_PING_INTERVAL)
+        except Exception:
+            return
+        self.latency_ms = (time.monotonic() - sent) * 1000
+        self.latency_updated.emit(self.latency_ms)
+
+    def _on_connect(self):
+        self.connection_changed.emit(True)
+        self._resync_requested.emit()
+
+    def _on_disconnect(self):
+        self.connection_changed.emit(False)
+
+    def _queue_handler(self, event: str):
+        def _handler(data=None):
+            with self._lock:
+                self._pending.append((event, data))
+        return _handler
+
+    # --- GUI スレッド ---
+    @Slot()
+    def resync(self):
+        if self._resyncing:
+            return
+        self._resyncing = True
+        self._http.get('/early_press/current_order', self._on_snapshot, self._on_snapshot_failed)
+
+    def _on_snapshot(self, status: int, data: Any):
+        if not 200 <= status < 300 or not isinstance(data, dict):
+            self._on_snapshot_failed(f"HTTP {status}")
+            return
+        self._resyncing = False
+        self.seq = data.get("seq", 0)
+        self.order_snapshot.emit(data.get("order", []))
+        held, self._held = self._held, []
+        self._apply_deltas(held)
+
+    def _on_snapshot_failed(self, error: str):
+        self._resyncing = False
+        self._held = []
+        self.resync_failed.emit(error)
+
+    def _apply_deltas(self, deltas: List[Dict[str, Any]]):
+        ready = []
+        for i, delta in enumerate(deltas):
+            if self._resyncing:
+                self._held.extend(deltas[i:])
+                break
+            seq = delta.get("seq", 0)
+            if seq <= self.seq:
+                continue
+            if seq != self.seq + 1:
+                # 取りこぼしがあったので全体を取り直し、残りは取り直した後に当てる
+                self._held.extend(deltas[i:])
+                self.resync()
+                break
+            self.seq = seq
+            ready.append(delta)
+        if ready:
+            self.order_deltas.emit(ready)
+
+    def _drain(self):
+        with self._lock:
+            if not self._pending:
+                return
+            events, self._pending = self._pending, []
+
+        deltas: List[Dict[str, Any]] = []
+        for event, data in events:
+            if event == 'early_press_order_delta':
+                deltas.append(data)
+                continue
+            # 差分以外のイベントの前に、それまでの差分を反映しておく
+            if deltas:
+                self._apply_deltas(deltas)
+                deltas = []
+            if event == 'early_press_game_reset':
+                self.seq = (data or {}).get("seq", 0)
+                self._held = []
+                self.game_reset.emit(data or {})
+            elif event == 'early_press_game_stopped':
+                self.game_stopped.emit()
+            elif event == 'early_press_winner':
+                self.winner.emit(data or {})
+            elif event == 'score_updated':
+                self.score_updated.emit(data or {})
+        if deltas:
+            self._apply_deltas(deltas)
+
+
+_shared_client: Optional[RealtimeClient] = None
+
+
+# 全ウィンドウで1本の接続を共有する (GUI スレッドから呼ぶ)
+def shared_realtime_client() -> RealtimeClient:
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = RealtimeClient()
+        _shared_client.start()
+    return _shared_client
@@ -0,0 +1,74 @@
+# reconnect.py
+
+import random
+from typing import Any, Dict, Optional
+
+from constants import RECONNECT_BASE_DELAY, RECONNECT_MAX_DELAY
+
+
+# ジッター付きの指数バックオフ。
+# 待ち時間は base * 2^n を上限 max_delay で頭打ちにし、その 50〜100% の範囲でランダムにずらす
+# (同時に落ちた複数台が同じタイミングで再接続しに行かないように)。
+class ExponentialBackoff:
+    def __init__(self, base: float = RECONNECT_BASE_DELAY, max_delay: float = RECONNECT_MAX_DELAY):
+        self.base = base
+        self.max_delay = max_delay
+        self.attempts = 0
+
+    def reset(self):
+        self.attempts = 0
+
+    def next_delay(self) -> float:
+        delay = min(self.max_delay, self.base * (2 ** self.attempts))
+        self.attempts += 1
+        return delay * random.uniform(0.5, 1.0)
+
+
+# デバイス1台分の切断・再接続の記録
+class LinkStats:
+    __slots__ = (
+        "address", "name", "disconnects", "reconnects", "attempts",
+        "downtime_total", "last_downtime", "down_since",
+    )
+
+    def __init__(self, address: str, name: Optional[str] = None):
+        self.address = address
+        self.name = name
+        self.disconnects = 0
+        self.reconnects = 0
+        self.attempts = 0         # 現在の切断中に試した再接続の回数
+        self.downtime_total = 0.0  # 累計の停止時間 (秒)
+        self.last_downtime = 0.0   # 直近に復帰したときの停止時間 (秒)
+        self.down_since: Optional[float] = None
+
+    @property
+    def is_down(self) -> bool:
+        return self.down_since is not None
+
+    def mark_down(self, now: float):
+        if self.down_since is None:
+            self.down_since = now
+            self.disconnects += 1
+            self.attempts = 0
+
+    def mark_up(self, now: float):
+        if self.down_since is None:
+            return
+        self.last_downtime = now - self.down_since
+        self.downtime_total += self.last_downtime
+        self.reconnects += 1
+        self.down_since = None
+
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        current = now - self.down_since if self.down_since is not None else 0.0
+        return {
+            "address": self.address,
+            "name": self.name,
+            "connected": self.down_since is None,
+            "disconnects": self.disconnects,
+            "reconnects": self.reconnects,
+            "attempts": self.attempts,
+            "downtime_total": self.downtime_total + current,
+            "last_downtime": self.last_downtime,
+            "current_downtime": current,
+        }